@@ -0,0 +1,13 @@
+# Gunicorn settings, `gunicorn tracker.wsgi --config gunicorn.conf.py` (see Procfile).
+import os
+
+# Threaded workers: a request waiting on the database doesn't hold up the
+# worker's other threads, and with DB_POOL=True they share one connection pool.
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+
+# Keep the app (and its connection pool) out of the master process, every
+# worker opens its own connections after the fork.
+preload_app = False
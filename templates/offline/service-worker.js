@@ -0,0 +1,273 @@
+{% load static %}
+// Tracc service worker: offline pages and a queue of log writes made offline.
+// Served from the site root so it controls every page, see views.service_worker.
+const VERSION = "{{ release|default:'dev' }}";
+const ASSET_CACHE = `tracc-assets-${VERSION}`;
+const PAGE_CACHE = "tracc-pages";
+const OFFLINE_URL = "{% url 'offline' %}";
+const SYNC_URL = "{% url 'sync_weight_logs' %}";
+const SYNC_TAG = "tracc-log-sync";
+const SYNC_BATCH_SIZE = {{ sync_batch_size }};
+
+const PRECACHE = [
+  OFFLINE_URL,
+  "{% static 'css/themes.css' %}",
+  "{% static 'css/fonts.css' %}",
+  "{% static 'css/styles.css' %}",
+  "{% static 'manifest.json' %}",
+  "{% static 'assets/img/tp-logo.png' %}",
+];
+
+// Pages (and the analytics chart data) kept for offline reading, per signed in user.
+const PAGES = [
+  "{% url 'dashboard' %}",
+  "{% url 'weightlog_list' %}",
+  "{% url 'analytics' %}",
+];
+const CHARTS_PREFIX = "{% url 'analytics_chart' 'CHART' %}".replace("CHART/", "");
+
+// Signing in or out drops the cached pages and the session, they belong to the previous user.
+const SESSION_URLS = ["{% url 'login' %}", "{% url 'logout' %}"];
+
+// Log writes that get queued when the network is down, with where the view redirects after them.
+const CLOCK_IN_URL = "{% url 'clock_in' %}";
+const ADD_LOG_URL = "{% url 'add_weight_log' %}";
+const EDIT_LOG_PATTERN = new RegExp("^" + "{% url 'edit_weight_log' 0 %}".replace("0", "(\\d+)") + "$");
+const DASHBOARD_URL = "{% url 'dashboard' %}";
+const LOGS_URL = "{% url 'weightlog_list' %}";
+
+
+// ---------- IndexedDB ----------
+function openDb() {
+  return new Promise((resolve, reject) => {
+    const request = indexedDB.open("tracc", 1);
+    request.onupgradeneeded = () => {
+      request.result.createObjectStore("queue", { keyPath: "id" });
+      request.result.createObjectStore("meta");
+    };
+    request.onsuccess = () => resolve(request.result);
+    request.onerror = () => reject(request.error);
+  });
+}
+
+async function withStore(name, mode, action) {
+  const db = await openDb();
+  return new Promise((resolve, reject) => {
+    const tx = db.transaction(name, mode);
+    const request = action(tx.objectStore(name));
+    tx.oncomplete = () => resolve(request && request.result);
+    tx.onerror = () => reject(tx.error);
+  });
+}
+
+const queued = () => withStore("queue", "readonly", store => store.getAll());
+const enqueue = entry => withStore("queue", "readwrite", store => store.put(entry));
+const dequeue = ids => withStore("queue", "readwrite", store => ids.forEach(id => store.delete(id)));
+const getMeta = key => withStore("meta", "readonly", store => store.get(key));
+const setMeta = (key, value) => withStore("meta", "readwrite", store => store.put(value, key));
+
+
+// ---------- Lifecycle ----------
+self.addEventListener("install", event => {
+  event.waitUntil(caches.open(ASSET_CACHE).then(cache => cache.addAll(PRECACHE)));
+  self.skipWaiting();
+});
+
+self.addEventListener("activate", event => {
+  event.waitUntil((async () => {
+    const names = await caches.keys();
+    await Promise.all(
+      names.filter(name => name.startsWith("tracc-") && name !== ASSET_CACHE && name !== PAGE_CACHE)
+        .map(name => caches.delete(name))
+    );
+    await self.clients.claim();
+  })());
+});
+
+
+// ---------- Fetch ----------
+self.addEventListener("fetch", event => {
+  const request = event.request;
+  const url = new URL(request.url);
+
+  if (request.method === "POST") {
+    if (url.origin === self.location.origin && logWrite(url.pathname)) {
+      event.respondWith(postOrQueue(request, url.pathname));
+    }
+    return;
+  }
+  if (request.method !== "GET") {
+    return;
+  }
+
+  if (url.origin !== self.location.origin) {
+    // CDN scripts and styles.
+    event.respondWith(staleWhileRevalidate(request));
+  } else if (url.pathname.startsWith("{% get_static_prefix %}")) {
+    event.respondWith(staleWhileRevalidate(request));
+  } else if (request.mode === "navigate" && SESSION_URLS.includes(url.pathname)) {
+    event.respondWith(
+      Promise.all([caches.delete(PAGE_CACHE), setMeta("session", null)]).then(() => fetch(request))
+    );
+  } else if (PAGES.includes(url.pathname) || url.pathname.startsWith(CHARTS_PREFIX)) {
+    event.respondWith(networkFirst(request));
+  } else if (request.mode === "navigate") {
+    event.respondWith(fetch(request).catch(() => caches.match(OFFLINE_URL)));
+  }
+});
+
+async function staleWhileRevalidate(request) {
+  const cache = await caches.open(ASSET_CACHE);
+  const cached = await cache.match(request);
+  const fresh = fetch(request).then(response => {
+    if (response.ok || response.type === "opaque") {
+      cache.put(request, response.clone());
+    }
+    return response;
+  });
+  return cached || fresh;
+}
+
+async function networkFirst(request) {
+  const cache = await caches.open(PAGE_CACHE);
+  try {
+    const response = await fetch(request);
+    // Redirects (to the login page) and errors are never kept.
+    if (response.ok && !response.redirected) {
+      cache.put(request, response.clone());
+    }
+    return response;
+  } catch (error) {
+    const cached = await cache.match(request, { ignoreSearch: true });
+    if (cached) {
+      return cached;
+    }
+    if (request.mode === "navigate") {
+      return caches.match(OFFLINE_URL);
+    }
+    throw error;
+  }
+}
+
+
+// ---------- Offline log writes ----------
+function logWrite(pathname) {
+  return pathname === CLOCK_IN_URL || pathname === ADD_LOG_URL || EDIT_LOG_PATTERN.test(pathname);
+}
+
+function localDate(now) {
+  const pad = n => String(n).padStart(2, "0");
+  return `${now.getFullYear()}-${pad(now.getMonth() + 1)}-${pad(now.getDate())}`;
+}
+
+async function postOrQueue(request, pathname) {
+  const form = await request.clone().formData();
+  try {
+    return await fetch(request);
+  } catch (error) {
+    // Offline, keep it for the next sync and carry on like the view would.
+    const session = await getMeta("session");
+    if (!session) {
+      throw error;
+    }
+    const edit = pathname.match(EDIT_LOG_PATTERN);
+    const now = new Date();
+    const weight = form.get("weight") || "";
+    await enqueue({
+      id: self.crypto.randomUUID(),
+      user: session.user,
+      log_id: edit ? Number(edit[1]) : null,
+      date: localDate(now),
+      recorded_at: now.toISOString(),
+      weight: weight,
+      notes: form.get("notes") || "",
+      check_in: form.get("check_in") === "true",
+    });
+    if (self.registration.sync) {
+      self.registration.sync.register(SYNC_TAG).catch(() => {});
+    }
+    notifyClients({ type: "queued", pending: await pendingCount(session.user) });
+    return Response.redirect(weight ? LOGS_URL : DASHBOARD_URL, 303);
+  }
+}
+
+async function pendingCount(user) {
+  return (await queued()).filter(entry => entry.user === user).length;
+}
+
+async function notifyClients(message) {
+  const clients = await self.clients.matchAll({ type: "window" });
+  clients.forEach(client => client.postMessage(message));
+}
+
+// Sends the signed in user's queue in batches. Entries the server applied or
+// rejected leave the queue, anything else (offline, signed out) stays for later.
+let flushing = null;
+
+function flush() {
+  if (!flushing) {
+    flushing = flushQueue().finally(() => { flushing = null; });
+  }
+  return flushing;
+}
+
+async function flushQueue() {
+  const session = await getMeta("session");
+  if (!session) {
+    return;
+  }
+  const entries = (await queued())
+    .filter(entry => entry.user === session.user)
+    .sort((a, b) => a.recorded_at.localeCompare(b.recorded_at));
+
+  let synced = 0;
+  let rejected = 0;
+  for (let start = 0; start < entries.length; start += SYNC_BATCH_SIZE) {
+    const batch = entries.slice(start, start + SYNC_BATCH_SIZE);
+    let response;
+    try {
+      response = await fetch(SYNC_URL, {
+        method: "POST",
+        credentials: "same-origin",
+        redirect: "manual",
+        headers: { "Content-Type": "application/json", "X-CSRFToken": session.csrfToken },
+        body: JSON.stringify({ entries: batch }),
+      });
+    } catch (error) {
+      break;
+    }
+    if (!response.ok) {
+      break;
+    }
+
+    const { results } = await response.json();
+    await dequeue(results.map(result => result.id));
+    synced += results.filter(result => result.status === "ok").length;
+    rejected += results.filter(result => result.status !== "ok").length;
+  }
+
+  if (synced || rejected) {
+    notifyClients({ type: "synced", synced, rejected, pending: await pendingCount(session.user) });
+  }
+}
+
+self.addEventListener("sync", event => {
+  if (event.tag === SYNC_TAG) {
+    event.waitUntil(flush());
+  }
+});
+
+// Pages report who is signed in (and their CSRF token) on load and when the
+// connection comes back, which is also when the queue gets flushed.
+self.addEventListener("message", event => {
+  const data = event.data || {};
+  if (data.type === "session") {
+    event.waitUntil((async () => {
+      await setMeta("session", { user: data.user, csrfToken: data.csrfToken });
+      if (data.online) {
+        await flush();
+      }
+      event.source.postMessage({ type: "pending", pending: await pendingCount(data.user) });
+    })());
+  }
+});
@@ -87,13 +87,73 @@ WSGI_APPLICATION = 'tracker.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# DB_POOL=True gives every worker process a psycopg 3 connection pool (PostgreSQL
+# only) that its gunicorn threads share, instead of a persistent connection per
+# thread. Size it with DB_POOL_MIN_SIZE/DB_POOL_MAX_SIZE, see gunicorn.conf.py.
+DB_POOL = os.environ.get("DB_POOL", "False") == "True"
+
 DATABASES = {
     'default': dj_database_url.config(
         default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
-        conn_max_age=600
+        # Pooled connections go back to the pool after every request.
+        conn_max_age=0 if DB_POOL else 600,
+        # Replace connections that died (restarts, failovers) instead of failing requests.
+        conn_health_checks=True,
     )
 }
 
+if DB_POOL and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    from psycopg_pool import ConnectionPool
+
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+        # At least one per thread, or threads queue for connections.
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', os.environ.get('GUNICORN_THREADS', 4))),
+        # Seconds a request waits for a free connection before failing.
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+        'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+        # Connections are checked as they're handed out, broken ones replaced.
+        'check': ConnectionPool.check_connection,
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local-memory by default, e.g. CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# with CACHE_LOCATION=/var/tmp/tracc_cache to share it between workers on one box.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'tracc'),
+    }
+}
+
+
+# Insights
+# Aggregate monthly averages and BMI zones in the database instead of in Python.
+
+INSIGHTS_DB_AGGREGATES = os.environ.get("INSIGHTS_DB_AGGREGATES", "False") == "True"
+
+
+# Weekly summary jobs
+# A running job whose worker hasn't reported progress for this many seconds is failed, so its week can be queued again.
+
+SUMMARY_JOB_TIMEOUT = int(os.environ.get("SUMMARY_JOB_TIMEOUT", 900))
+
+
+# Conditional GET
+# Part of every page ETag, change it on deploys that alter the pages so browsers refetch them.
+
+RELEASE_VERSION = os.environ.get("RELEASE_VERSION", "")
+
+
+# Metrics
+# Prometheus scrapes /metrics/ with this as a bearer token. Without one they're only served with DEBUG on.
+
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -143,3 +203,5 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 MIDDLEWARE.insert(1, "whitenoise.middleware.WhiteNoiseMiddleware")
+# After whitenoise, static files aren't app requests.
+MIDDLEWARE.insert(2, "weight.metrics.MetricsMiddleware")
@@ -4,6 +4,11 @@ from .models import *
 # Register your models here.
 admin.site.register(Profile)
 admin.site.register(WeightLog)
+admin.site.register(ProfileStats)
+admin.site.register(StreakRun)
 admin.site.register(Milestone)
 admin.site.register(UserMilestone)
-admin.site.register(WeeklySummary)
\ No newline at end of file
+admin.site.register(WeeklySummary)
+admin.site.register(SummaryJob)
+admin.site.register(ApiToken)
+admin.site.register(IngestedReading)
\ No newline at end of file
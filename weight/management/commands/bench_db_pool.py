@@ -0,0 +1,155 @@
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+
+# (label, environment) of each gunicorn run, the same workers and threads for both.
+MODES = [
+    ("Persistent connections", {"DB_POOL": "False"}),
+    ("Connection pool", {"DB_POOL": "True"}),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the app under gunicorn's threaded workers, with persistent connections "
+        "and with the connection pool, against the configured (local) PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000, help="Requests per mode.")
+        parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight at once.")
+        parser.add_argument(
+            "--path", action="append",
+            help="Paths requested in turn (repeatable), defaults to the dashboard, logs and health check.",
+        )
+        parser.add_argument("--user", default="synthetic-0", help="User the pages are requested as.")
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--pool-size", type=int, help="DB_POOL_MAX_SIZE, defaults to --threads.")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--json", help="Also write the results to this file.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Pooling is PostgreSQL only, point DATABASE_URL at a local PostgreSQL.")
+        user = User.objects.filter(username=options["user"]).first()
+        if user is None:
+            raise CommandError(f"No user {options['user']!r}, run seed_synthetic_data first.")
+
+        # A session stored in the database, every worker accepts it.
+        client = Client()
+        client.force_login(user)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        paths = options["path"] or ["/dashboard/", "/logs/", "/healthz/"]
+
+        results = {}
+        for label, env in MODES:
+            env = {
+                **os.environ, **env,
+                "DB_POOL_MAX_SIZE": str(options["pool_size"] or options["threads"]),
+                "GUNICORN_THREADS": str(options["threads"]),
+                "WEB_CONCURRENCY": str(options["workers"]),
+            }
+            with GunicornServer(env, options["port"]):
+                # Warm up: workers import the app and open their first connections.
+                self.load(paths, cookie, options["concurrency"] * 2, options["concurrency"], options["port"])
+                started = time.perf_counter()
+                timings, errors = self.load(paths, cookie, options["requests"], options["concurrency"], options["port"])
+                seconds = time.perf_counter() - started
+
+            timings.sort()
+            results[label] = {
+                "requests": options["requests"],
+                "errors": errors,
+                "requests_per_second": round(options["requests"] / seconds, 1),
+                "p50_ms": round(statistics.median(timings), 2) if timings else None,
+                "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 2) if timings else None,
+                "p99_ms": round(timings[int(len(timings) * 0.99) - 1], 2) if timings else None,
+                "max_ms": round(timings[-1], 2) if timings else None,
+            }
+            result = results[label]
+            self.stdout.write(
+                f"⏱️ {label:<24} p50 {result['p50_ms']:>8} ms, p95 {result['p95_ms']:>8} ms, "
+                f"p99 {result['p99_ms']:>8} ms, {result['requests_per_second']:>7} req/s, {errors} errors"
+            )
+
+        if options["json"]:
+            with open(options["json"], "w") as f:
+                json.dump(results, f, indent=2)
+        self.stdout.write(self.style.SUCCESS("✅ Pool benchmark complete."))
+
+    def load(self, paths, cookie, total, concurrency, port):
+        """Fires `total` GETs, `concurrency` at a time. Returns (ms of the OK ones, errors)."""
+        def request(i):
+            path = paths[i % len(paths)]
+            started = time.perf_counter()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            try:
+                conn.request("GET", path, headers={"Cookie": cookie})
+                response = conn.getresponse()
+                response.read()
+                ok = response.status == 200
+            except OSError:
+                ok = False
+            finally:
+                conn.close()
+            return ok, (time.perf_counter() - started) * 1000
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(request, range(total)))
+        return [ms for ok, ms in outcomes if ok], sum(1 for ok, _ in outcomes if not ok)
+
+
+class GunicornServer:
+    """Runs gunicorn with the project's config for the duration of a `with` block."""
+
+    def __init__(self, env, port):
+        self.env = env
+        self.port = port
+
+    def __enter__(self):
+        self.log = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(
+            [
+                sys.executable, "-m", "gunicorn", "tracker.wsgi",
+                "--config", str(settings.BASE_DIR / "gunicorn.conf.py"),
+                "--bind", f"127.0.0.1:{self.port}",
+            ],
+            cwd=settings.BASE_DIR, env=self.env, stdout=subprocess.DEVNULL, stderr=self.log,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                self.log.seek(0)
+                raise CommandError(f"gunicorn exited:\n{self.log.read().decode()[-2000:]}")
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=1)
+                conn.request("GET", "/healthz/")
+                conn.getresponse().read()
+                conn.close()
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__()
+        raise CommandError("gunicorn didn't come up within 30s.")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.log.close()
@@ -0,0 +1,113 @@
+import math
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from weight.utils import daily_series
+
+
+def pandas_daily_series(rows, start_date=None, end_date=None):
+    """The pandas reindex/ffill/bfill line data builder `daily_series` replaced."""
+    if not rows:
+        return {}
+
+    df = pd.DataFrame({"date": [row[0] for row in rows], "weight": [row[1] for row in rows]})
+    df.set_index("date", inplace=True)
+    df.sort_index(inplace=True)
+
+    if not start_date:
+        start_date, end_date = df.index.min(), df.index.max()
+
+    full_range = pd.date_range(start=start_date, end=end_date, freq='D')
+    df = df.reindex(full_range)
+    df["weight"] = df["weight"].ffill().bfill()
+
+    return {
+        "labels": [d.strftime('%d-%m-%Y') for d in df.index],
+        "weights": df["weight"].tolist(),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare latency and allocations of the pure Python line data builder against "
+        "the old pandas one, for the dashboard and analytics series, on synthetic logs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=730, help="Days of history.")
+        parser.add_argument("--runs", type=int, default=300, help="Timed runs per case.")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        rows = self.history(rng, options["days"])
+        week_start = rows[-1][0] - timedelta(days=13)
+        week = (week_start, week_start + timedelta(days=6))
+
+        cases = [
+            ("Full history (analytics)", rows, ()),
+            ("Recent 5 logs (dashboard)", rows[-5:], ()),
+            ("Summary week", [row for row in rows if week[0] <= row[0] <= week[1]], week),
+        ]
+        for label, case_rows, date_range in cases:
+            expected = pandas_daily_series(case_rows, *date_range)
+            if not self.same(daily_series(case_rows, *date_range), expected):
+                raise CommandError(f"{label}: daily_series output differs from the pandas version")
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{label} ({len(expected['labels'])} days)"))
+            for name, build in (("pandas", pandas_daily_series), ("daily_series", daily_series)):
+                timings = self.time(build, case_rows, date_range, options["runs"])
+                peak = self.allocations(build, case_rows, date_range)
+                self.stdout.write(
+                    f"  {name:<13} median {statistics.median(timings):8.3f} ms, "
+                    f"p95 {timings[int(len(timings) * 0.95) - 1]:8.3f} ms, "
+                    f"peak allocations {peak / 1024:8.1f} KiB"
+                )
+
+        self.stdout.write(self.style.SUCCESS("\nOutputs identical, benchmark complete."))
+
+    def history(self, rng, days):
+        """Date-ordered (date, weight) rows with the odd missed day."""
+        first_day = date.today() - timedelta(days=days)
+        weight = 95.0
+        rows = []
+        for i in range(days):
+            weight += rng.uniform(-0.4, 0.35)
+            if rng.random() < 0.15:
+                continue
+            rows.append((first_day + timedelta(days=i), round(weight, 1)))
+        return rows
+
+    def time(self, build, rows, date_range, runs):
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            build(rows, *date_range)
+            timings.append((time.perf_counter() - started) * 1000)
+        return sorted(timings)
+
+    def allocations(self, build, rows, date_range):
+        """Peak memory allocated during one (warm) call, on top of what was live before."""
+        build(rows, *date_range)
+        tracemalloc.start()
+        try:
+            baseline, _ = tracemalloc.get_traced_memory()
+            build(rows, *date_range)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak - baseline
+
+    def same(self, ours, theirs):
+        if ours.keys() != theirs.keys() or ours.get("labels") != theirs.get("labels"):
+            return False
+        return all(
+            a == b or (math.isnan(a) and math.isnan(b))
+            for a, b in zip(ours.get("weights", []), theirs.get("weights", []), strict=True)
+        )
@@ -0,0 +1,108 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter: boots the app like a gunicorn worker does on its
+# first request (WSGI handler plus the urlconf, which imports the views).
+WORKER_BOOT = """
+import json, sys, time
+started = time.perf_counter()
+{imports}
+seconds = time.perf_counter() - started
+with open("/proc/self/status") as status:
+    rss_kib = next(int(line.split()[1]) for line in status if line.startswith("VmRSS:"))
+print(json.dumps({{"seconds": seconds, "rss_kib": rss_kib, "modules": sorted(sys.modules)}}))
+"""
+
+SCENARIOS = [
+    ("Python + Django", "import django"),
+    ("Worker boot", (
+        "from django.core.wsgi import get_wsgi_application\n"
+        "application = get_wsgi_application()\n"
+        "from django.urls import get_resolver\n"
+        "get_resolver().url_patterns"
+    )),
+]
+
+HEAVY_MODULES = ["pandas", "numpy", "dateutil", "pytz", "PIL"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the import time and memory of a freshly booted worker, and which "
+        "packages it spends that on, to size the number of workers per box."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per scenario.")
+        parser.add_argument("--top", type=int, default=12, help="Packages listed by import time.")
+        parser.add_argument("--box-memory", type=int, help="MiB available for workers, prints how many fit.")
+        parser.add_argument("--json", help="Also write the results to this file.")
+
+    def handle(self, *args, **options):
+        if not os.path.exists("/proc/self/status"):
+            raise CommandError("Memory is read from /proc, run this on Linux.")
+
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "tracker.settings")}
+        results = {}
+        for label, imports in SCENARIOS:
+            runs = [self.run_child(imports, env) for _ in range(options["runs"])]
+            seconds = statistics.median(run["seconds"] for run in runs)
+            rss_mib = statistics.median(run["rss_kib"] for run in runs) / 1024
+            heavy = [name for name in HEAVY_MODULES if name in runs[0]["modules"]]
+            results[label] = {
+                "import_ms": round(seconds * 1000, 1),
+                "rss_mib": round(rss_mib, 1),
+                "modules": len(runs[0]["modules"]),
+                "heavy_modules": heavy,
+                "packages_ms": runs[0]["packages_ms"],
+            }
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{label}"))
+            self.stdout.write(
+                f"  import {seconds * 1000:.1f} ms, RSS {rss_mib:.1f} MiB, "
+                f"{len(runs[0]['modules'])} modules, heavy: {', '.join(heavy) or 'none'}"
+            )
+            for package, ms in list(runs[0]["packages_ms"].items())[:options["top"]]:
+                self.stdout.write(f"    {ms:8.1f} ms  {package}")
+
+        boot, bare = results["Worker boot"], results["Python + Django"]
+        self.stdout.write(f"\n📦 The app adds {boot['rss_mib'] - bare['rss_mib']:.1f} MiB per worker on top of Django.")
+        if options["box_memory"]:
+            self.stdout.write(
+                f"🧮 ≈ {int(options['box_memory'] // boot['rss_mib'])} freshly booted workers "
+                f"fit in {options['box_memory']} MiB (before any request-time growth)."
+            )
+
+        if options["json"]:
+            with open(options["json"], "w") as f:
+                json.dump(results, f, indent=2)
+        self.stdout.write(self.style.SUCCESS("✅ Startup benchmark complete."))
+
+    def run_child(self, imports, env):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", WORKER_BOOT.format(imports=imports)],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if completed.returncode:
+            raise CommandError(f"Worker boot failed:\n{completed.stderr[-2000:]}")
+
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        result["packages_ms"] = self.packages_ms(completed.stderr)
+        return result
+
+    def packages_ms(self, importtime):
+        """Self import time per top-level package, from `-X importtime` output, slowest first."""
+        totals = defaultdict(int)
+        for line in importtime.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            self_us, _, name = line[len("import time:"):].split("|")
+            totals[name.strip().split(".")[0]] += int(self_us)
+        return {name: round(us / 1000, 1) for name, us in sorted(totals.items(), key=lambda item: -item[1])}
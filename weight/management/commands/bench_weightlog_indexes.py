@@ -0,0 +1,135 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from weight.models import Profile, WeightLog
+
+BEFORE_TABLE = "bench_weightlog_before"
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway WeightLog dataset and compare query plans and timings of the hot "
+        "log queries with the (profile, date) indexes against the plain FK index. "
+        "Everything runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", type=int, default=2000, help="Profiles to seed.")
+        parser.add_argument("--days", type=int, default=1000, help="Daily logs per profile.")
+        parser.add_argument("--runs", type=int, default=200, help="Timed runs per query.")
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Run even when DEBUG is off (the seed holds table locks until rollback).",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options["force"]:
+            raise CommandError("Refusing to run with DEBUG off, pass --force on a throwaway database.")
+
+        with transaction.atomic():
+            profile_ids = self.seed(options["profiles"], options["days"], options["batch_size"])
+            self.copy_before_table()
+
+            for label, queryset_for in self.hot_queries():
+                self.stdout.write(self.style.MIGRATE_HEADING(f"\n{label}"))
+                sql, params = queryset_for(profile_ids[0]).query.sql_with_params()
+                for table in (BEFORE_TABLE, WeightLog._meta.db_table):
+                    table_sql = self.for_table(sql, table)
+                    self.stdout.write(f"  [{table}]")
+                    for line in self.explain(table_sql, params):
+                        self.stdout.write(f"    {line}")
+
+                    timings = []
+                    for _ in range(options["runs"]):
+                        sql, params = queryset_for(random.choice(profile_ids)).query.sql_with_params()
+                        started = time.perf_counter()
+                        with connection.cursor() as cursor:
+                            cursor.execute(self.for_table(sql, table), params)
+                            cursor.fetchall()
+                        timings.append((time.perf_counter() - started) * 1000)
+
+                    timings.sort()
+                    avg = sum(timings) / len(timings)
+                    p95 = timings[int(len(timings) * 0.95) - 1]
+                    self.stdout.write(f"    avg {avg:.3f} ms, p95 {p95:.3f} ms")
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS("\nBenchmark complete, seeded data rolled back."))
+
+    def seed(self, profile_count, days, batch_size):
+        self.stdout.write(f"Seeding {profile_count} profiles x {days} days = {profile_count * days} logs…")
+        started = time.perf_counter()
+
+        users = User.objects.bulk_create(
+            [User(username=f"bench-index-{i}") for i in range(profile_count)]
+        )
+        profiles = Profile.objects.bulk_create(
+            [Profile(user=user, height_cm=170, target_weight=70) for user in users]
+        )
+
+        first_day = date.today() - timedelta(days=days)
+        batch = []
+        for profile in profiles:
+            weight = random.uniform(70, 110)
+            for i in range(days):
+                weight += random.uniform(-0.4, 0.35)
+                check_in = random.random() < 0.7
+                batch.append(WeightLog(
+                    profile=profile,
+                    date=first_day + timedelta(days=i),
+                    weight=round(weight, 1),
+                    check_in=check_in,
+                ))
+                if len(batch) >= batch_size:
+                    WeightLog.objects.bulk_create(batch)
+                    batch = []
+        WeightLog.objects.bulk_create(batch)
+
+        self.stdout.write(f"Seeded in {time.perf_counter() - started:.1f}s")
+        return [profile.pk for profile in profiles]
+
+    def copy_before_table(self):
+        # Same rows, but only the FK index WeightLog had before the composite indexes.
+        table = connection.ops.quote_name(WeightLog._meta.db_table)
+        before = connection.ops.quote_name(BEFORE_TABLE)
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE {before} AS SELECT * FROM {table}")
+            cursor.execute(f"CREATE INDEX bench_weightlog_before_profile ON {before} (profile_id)")
+            cursor.execute(f"ANALYZE {before}")
+            cursor.execute(f"ANALYZE {table}")
+
+    def hot_queries(self):
+        today = date.today()
+        week_end = today - timedelta(days=today.weekday() + 1)
+        week_start = week_end - timedelta(days=6)
+
+        def logs(profile_id):
+            return WeightLog.objects.filter(profile_id=profile_id)
+
+        return [
+            ("Dashboard recent logs", lambda pk: logs(pk).exclude(weight__isnull=True).order_by("-date")[:5]),
+            ("Clock-in today's log", lambda pk: logs(pk).filter(date=today)),
+            ("Weekly summary range", lambda pk: logs(pk).filter(date__range=(week_start, week_end)).order_by("date")),
+            ("Streak check-ins", lambda pk: logs(pk).filter(check_in=True).exclude(weight__isnull=True).order_by("check_in_at")),
+        ]
+
+    def for_table(self, sql, table):
+        return sql.replace(
+            connection.ops.quote_name(WeightLog._meta.db_table),
+            connection.ops.quote_name(table),
+        )
+
+    def explain(self, sql, params):
+        options = {"analyze": True} if connection.vendor == "postgresql" else {}
+        prefix = connection.ops.explain_query_prefix(**options)
+        with connection.cursor() as cursor:
+            cursor.execute(f"{prefix} {sql}", params)
+            return [str(row[-1]) for row in cursor.fetchall()]
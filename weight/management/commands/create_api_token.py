@@ -0,0 +1,22 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from weight.models import ApiToken
+
+
+class Command(BaseCommand):
+    help = "Issue an API token a smart scale or health app uses to push a user's readings to api/readings/."
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument("--name", default="Scale", help="What the token is for, shown in the admin.")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options["username"]).first()
+        if user is None:
+            raise CommandError(f"No user named {options['username']!r}.")
+
+        token, key = ApiToken.issue(user, options["name"])
+        self.stdout.write(self.style.SUCCESS(f"🔑 Token {token.name!r} issued for {user.username}:"))
+        self.stdout.write(key)
+        self.stdout.write("Send it as `Authorization: Bearer <token>`, it won't be shown again.")
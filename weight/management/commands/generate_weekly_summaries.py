@@ -1,12 +1,90 @@
-from django.core.management.base import BaseCommand
-from django.utils import timezone
-from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+from itertools import groupby
+import math
+import time
+import traceback
 from weight.models import WeightLog, WeeklySummary, Profile
+from weight.utils import bump_data_version, last_week
+
+# Profiles summarised per round of queries.
+BATCH_SIZE = 500
+
+
+def shard_id_range(shard, shards, max_id):
+    """(low, high] profile id range of the 1-based `shard` out of `shards`."""
+    size = math.ceil(max_id / shards) if max_id else 0
+    return size * (shard - 1), size * shard
+
+
+def run_shard(shard, shards, max_id, start_date, end_date, batch_size, verbosity, on_batch=None):
+    """
+    Summarises one id range shard, in this process or a pool worker.
+
+    Never raises, failures are reported back so the shard can be retried on its own.
+    `on_batch(result)` is called after every batch with the running totals.
+    """
+    started = time.perf_counter()
+    result = {"shard": shard, "profiles": 0, "generated": 0, "skipped": 0, "failures": [], "error": None}
+    command = Command()
+    command.verbosity = verbosity
+    try:
+        low, high = shard_id_range(shard, shards, max_id)
+        profiles = Profile.objects.filter(id__gt=low, id__lte=high)
+        for batch in command.iter_profile_batches(batch_size, profiles):
+            generated, skipped, failures = command.process_batch(batch, start_date, end_date)
+            result["profiles"] += len(batch)
+            result["generated"] += generated
+            result["skipped"] += skipped
+            result["failures"] += failures
+            if on_batch:
+                on_batch(result)
+            if verbosity >= 2:
+                command.stdout.write(f"[shard {shard}/{shards}] up to profile {batch[-1][0]}")
+    except Exception:
+        result["error"] = traceback.format_exc()
+
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def run_shard_in_worker(*args):
+    try:
+        return run_shard(*args)
+    finally:
+        connections.close_all()
+
 
 class Command(BaseCommand):
     help = "Generates weekly summaries for all users"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=BATCH_SIZE,
+            help="Profiles whose logs are fetched and summarised together.",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=1,
+            help="Split profiles into this many id range shards, each run in its own process.",
+        )
+        parser.add_argument(
+            "--shard", type=str,
+            help="Run only shard i of N (1-based, e.g. 3/8), to retry a failed shard.",
+        )
+        parser.add_argument(
+            "--week-start", type=date.fromisoformat,
+            help="Monday (YYYY-MM-DD) of the week to summarise, defaults to last week.",
+        )
+        parser.add_argument(
+            "--max-id", type=int,
+            help="Highest profile id used to compute shard ranges (pins them for retries).",
+        )
+
     def generate_highlights(self, logs):
+        """`logs` are this week's (date, weight, bmi) rows ordered by date."""
         highlights = {}
 
         # logs count
@@ -16,84 +94,191 @@ class Command(BaseCommand):
         streak = 0
         max_streak = 0
         last_date = None
-        for log in logs.order_by('date'):
-            if last_date and (log.date - last_date).days == 1:
+        for log_date, _, _ in logs:
+            if last_date and (log_date - last_date).days == 1:
                 streak += 1
             else:
                 streak = 1
             if streak > max_streak:
                 max_streak = streak
-            last_date = log.date
+            last_date = log_date
         highlights['streak'] = f"Your longest streak: {max_streak} days in a row."
 
         # gain/loss detection
         gains = []
-        logs_list = list(logs.order_by('date'))
-        for i in range(1, len(logs_list)):
-            diff = round(logs_list[i].weight - logs_list[i-1].weight, 2)
+        weighed = [(log_date, weight) for log_date, weight, _ in logs if weight is not None]
+        for (_, prev_weight), (log_date, weight) in zip(weighed, weighed[1:]):
+            diff = round(weight - prev_weight, 2)
             if diff > 0:
-                gains.append(f"You gained {diff} kg on {logs_list[i].date.strftime('%A')}")
+                gains.append(f"You gained {diff} kg on {log_date.strftime('%A')}")
 
         highlights['gain'] = ', '.join(gains) if gains else "No gains this week!"
 
         return highlights, max_streak
 
+    def bmi_status(self, bmi):
+        if not bmi:
+            return ""
+        if bmi < 18.5:
+            return "Underweight"
+        if bmi < 25:
+            return "Normal"
+        if bmi < 30:
+            return "Overweight"
+        return "Obese"
+
+    def summarise(self, user_id, logs, start_date, end_date):
+        """Builds the WeeklySummary for one profile's last two weeks of logs, or None."""
+        week_logs = [log for log in logs if log[0] >= start_date]
+        weights = [weight for _, weight, _ in week_logs if weight]
+        if not weights:
+            return None
+
+        avg_weight = sum(weights) / len(weights)
+
+        # previous week's data (for change calculation)
+        prev_weights = [weight for log_date, weight, _ in logs if log_date < start_date and weight]
+        prev_avg = sum(prev_weights) / len(prev_weights) if prev_weights else avg_weight
+
+        highlights, streak = self.generate_highlights(week_logs)
+
+        return WeeklySummary(
+            user_id=user_id,
+            week_start=start_date,
+            week_end=end_date,
+            avg_weight=avg_weight,
+            change_from_last_week=round(avg_weight - prev_avg, 2),
+            bmi_status=self.bmi_status(week_logs[-1][2]),
+            highlights=highlights,
+            streak=streak,
+            has_checked=False,
+        )
 
-    def handle(self, *args, **kwargs):
+    def process_batch(self, profiles, start_date, end_date):
+        """Summarises a batch of (id, user_id, username) profiles with one log query."""
+        prev_start = start_date - timedelta(days=7)
+        logs = (
+            WeightLog.objects.filter(profile_id__in=[profile[0] for profile in profiles], date__range=(prev_start, end_date))
+            .order_by("profile_id", "date")
+            .values_list("profile_id", "date", "weight", "bmi")
+        )
+        logs_by_profile = {
+            profile_id: [row[1:] for row in rows]
+            for profile_id, rows in groupby(logs, key=lambda row: row[0])
+        }
+
+        summaries = []
+        summarised_ids = []
+        failures = []
+        for profile_id, user_id, username in profiles:
+            try:
+                summary = self.summarise(user_id, logs_by_profile.get(profile_id, []), start_date, end_date)
+            except Exception as e:
+                failures.append({"user": username, "error": f"{type(e).__name__}: {e}"})
+                continue
+            if summary is None:
+                if self.verbosity >= 2:
+                    self.stdout.write(f"⏭️ Skipped {username} — no logs found.")
+                continue
+
+            summaries.append(summary)
+            summarised_ids.append(profile_id)
+            if self.verbosity >= 2:
+                self.stdout.write(f"Summary generated for {username}")
+
+        WeeklySummary.objects.bulk_create(
+            summaries,
+            update_conflicts=True,
+            unique_fields=["user", "week_start", "week_end"],
+            update_fields=["avg_weight", "change_from_last_week", "bmi_status", "highlights", "streak", "has_checked"],
+        )
+        # bulk_create skips the save signals.
+        if summarised_ids:
+            bump_data_version(*summarised_ids)
+
+        return len(summaries), len(profiles) - len(summaries) - len(failures), failures
+
+    def iter_profile_batches(self, batch_size, profiles=None):
+        """Yields (id, user_id, username) batches in id order using keyset pagination."""
+        profiles = (profiles if profiles is not None else Profile.objects.all()).order_by("id")
+        last_id = 0
+        while True:
+            batch = list(profiles.filter(id__gt=last_id).values_list("id", "user_id", "user__username")[:batch_size])
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1][0]
+
+    def parse_shard(self, value):
         try:
-            today = timezone.now().date()
-            end_date = today - timedelta(days=today.weekday() + 1)  # last Sunday
-            start_date = end_date - timedelta(days=6)  # previous Monday
-            
-            self.stdout.write(f"Generating summaries for week: {start_date} → {end_date}")
-
-            profiles = Profile.objects.all()
-            for profile in profiles:
-                logs = WeightLog.objects.filter(profile=profile, date__range=(start_date, end_date)).order_by('date')
-                if not logs.exists():
-                    self.stdout.write(f"⏭️ Skipped {profile.user.username} — no logs found.")
-                    continue
-
-                weights = [log.weight for log in logs if log.weight]
-                if weights:
-                    avg_weight = sum(weights) / len(weights)
-
-                    # find previous week’s data (for change calculation)
-                    prev_start = start_date - timedelta(days=7)
-                    prev_end = end_date - timedelta(days=7)
-                    prev_logs = WeightLog.objects.filter(profile=profile, date__range=(prev_start, prev_end))
-                    prev_avg = sum([log.weight for log in prev_logs]) / len(prev_logs) if prev_logs.exists() else avg_weight
-
-                    weight_change = round(avg_weight - prev_avg, 2)
-                    bmi = logs.last().bmi if hasattr(logs.last(), 'bmi') else None  # optional if your model has BMI
-                    bmi_status = None
-                    if bmi:
-                        if bmi < 18.5: bmi_status = "Underweight"
-                        elif 18.5 <= bmi < 24.9: bmi_status = "Normal"
-                        elif 25 <= bmi < 29.9: bmi_status = "Overweight"
-                        else: bmi_status = "Obese"
-
-                    # highlights
-                    highlights, streak = self.generate_highlights(logs)
-
-                    WeeklySummary.objects.update_or_create(
-                        user=profile.user,
-                        week_start=start_date,
-                        week_end=end_date,
-                        defaults={
-                            "avg_weight": avg_weight,
-                            "change_from_last_week": weight_change,
-                            "bmi_status": bmi_status,
-                            "highlights": highlights,
-                            "streak": streak,
-                            "has_checked": False
-                        }
-                    )
-
-                    self.stdout.write(f"Summary generated for {profile.user.username}")
-        except Exception as e:
-            import traceback
-            self.stdout.write(f"Error occured while generating summaries: {e}")
-            traceback.print_exc()
+            shard, shards = (int(part) for part in value.split("/"))
+        except ValueError:
+            raise CommandError(f"--shard must look like i/N, got {value!r}")
+        if not 1 <= shard <= shards:
+            raise CommandError(f"--shard {value}: i must be between 1 and N")
+        return shard, shards
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        if options["week_start"]:
+            start_date = options["week_start"]
+            end_date = start_date + timedelta(days=6)
+        else:
+            start_date, end_date = last_week()
+
+        self.stdout.write(f"Generating summaries for week: {start_date} → {end_date}")
+
+        max_id = options["max_id"] or Profile.objects.aggregate(Max("id"))["id__max"] or 0
+        args = (max_id, start_date, end_date, options["batch_size"], self.verbosity)
+
+        started = time.perf_counter()
+        if options["shard"]:
+            shard, shards = self.parse_shard(options["shard"])
+            results = [run_shard(shard, shards, *args)]
+        elif options["workers"] > 1:
+            shards = options["workers"]
+            # Children open their own connections, don't let them share ours.
+            connections.close_all()
+            results = []
+            with ProcessPoolExecutor(max_workers=shards) as pool:
+                futures = [pool.submit(run_shard_in_worker, shard, shards, *args) for shard in range(1, shards + 1)]
+                for future in as_completed(futures):
+                    results.append(future.result())
+                    self.report_shard(results[-1], shards, max_id, start_date)
+        else:
+            shards = 1
+            results = [run_shard(1, 1, *args)]
+
+        if len(results) == 1:
+            self.report_shard(results[0], shards, max_id, start_date)
+
+        generated = sum(result["generated"] for result in results)
+        skipped = sum(result["skipped"] for result in results)
+        self.stdout.write(
+            f"{generated} summaries generated, {skipped} profiles skipped "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+
+        failed = [result for result in results if result["error"]]
+        if failed:
+            raise CommandError(f"{len(failed)} of {shards} shard(s) failed, retry them with the commands above.")
 
         self.stdout.write(self.style.SUCCESS("Weekly summary generation complete!"))
+
+    def report_shard(self, result, shards, max_id, start_date):
+        label = f"[shard {result['shard']}/{shards}]"
+        for failure in result["failures"]:
+            self.stderr.write(f"{label} Failed for {failure['user']}: {failure['error']}")
+
+        if result["error"]:
+            self.stderr.write(f"{label} Error occured while generating summaries:\n{result['error']}")
+            self.stderr.write(
+                f"{label} Retry with: manage.py generate_weekly_summaries "
+                f"--shard {result['shard']}/{shards} --max-id {max_id} --week-start {start_date}"
+            )
+            return
+
+        self.stdout.write(
+            f"{label} {result['generated']} generated, {result['skipped']} skipped, "
+            f"{len(result['failures'])} failed in {result['seconds']:.2f}s"
+        )
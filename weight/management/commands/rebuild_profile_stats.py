@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from weight.models import Profile, ProfileStats
+
+
+class Command(BaseCommand):
+    help = "Rebuild ProfileStats rows from the weight logs (all profiles or specific ones)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profile", type=int, action="append", help="Only rebuild this profile id (repeatable).")
+
+    def handle(self, *args, **options):
+        profile_ids = options["profile"] or Profile.objects.order_by("id").values_list("id", flat=True).iterator()
+
+        self.stdout.write("🚀 Rebuilding profile stats...")
+        rebuilt = 0
+        for profile_id in profile_ids:
+            ProfileStats.rebuild(profile_id)
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f"🎯 Rebuilt stats for {rebuilt} profiles."))
@@ -0,0 +1,222 @@
+import json
+import statistics
+import subprocess
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from weight.models import Profile, WeightLog
+from weight.utils import update_all_bmis, update_streaks
+from weight.views import ANALYTICS_CHARTS
+
+BENCHMARKS = [
+    "dashboard", "analytics", "analytics_cached", "analytics_charts", "import_csv", "export_csv",
+    "update_streaks", "update_all_bmis", "seed_milestones", "generate_weekly_summaries",
+]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the main views and jobs against the current database (seed it with "
+        "seed_synthetic_data) and write the results as JSON. Writes are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefix", default="synthetic", help="Benchmark as the seeded users with this prefix.")
+        parser.add_argument("--sample", type=int, default=5, help="Users the view benchmarks rotate through.")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark.")
+        parser.add_argument("--import-rows", type=int, default=2000, help="Rows in the imported CSV.")
+        parser.add_argument("--only", action="append", choices=BENCHMARKS, help="Run only these benchmarks (repeatable).")
+        parser.add_argument("--output", help="JSON file to write, defaults to benchmark-<timestamp>.json.")
+        parser.add_argument("--compare", help="Earlier JSON results to print the median changes against.")
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Run even when DEBUG is off (clears the cache and writes inside a rolled back transaction).",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options["force"]:
+            raise CommandError("Refusing to run with DEBUG off, pass --force on a throwaway database.")
+
+        profiles = list(
+            Profile.objects.filter(user__username__startswith=f"{options['prefix']}-")
+            .select_related("user").order_by("id")[:options["sample"]]
+        )
+        if not profiles:
+            raise CommandError(f"No {options['prefix']}-* users, run seed_synthetic_data first.")
+
+        report = {
+            "started_at": timezone.now().isoformat(),
+            "commit": self.git_commit(),
+            "database": connection.vendor,
+            "dataset": {
+                "profiles": Profile.objects.count(),
+                "weight_logs": WeightLog.objects.count(),
+            },
+            "options": {key: options[key] for key in ("prefix", "sample", "repeat", "import_rows")},
+            "results": {},
+        }
+
+        self.client = Client()
+        self.profiles = profiles
+        for name in options["only"] or BENCHMARKS:
+            with transaction.atomic():
+                result = self.measure(name, options["repeat"], options)
+                transaction.set_rollback(True)
+            report["results"][name] = result
+            self.stdout.write(
+                f"⏱️ {name:<28} median {result['median_ms']:>10.2f} ms, "
+                f"p95 {result['p95_ms']:>10.2f} ms, {result['queries']} queries"
+            )
+
+        # Entries cached against rolled back data versions must not outlive the run.
+        cache.clear()
+
+        output = options["output"] or f"benchmark-{timezone.now():%Y%m%d-%H%M%S}.json"
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+        if options["compare"]:
+            self.compare(options["compare"], report)
+        self.stdout.write(self.style.SUCCESS(f"✅ Results written to {output}"))
+
+    def measure(self, name, repeat, options):
+        bench = getattr(self, f"bench_{name}")
+        prepare = getattr(self, f"prepare_{name}", None)
+        timings = []
+        queries = None
+        for run in range(repeat):
+            profile = self.profiles[run % len(self.profiles)]
+            self.client.force_login(profile.user)
+            # Untimed setup (cache state, input files) of this run.
+            if prepare:
+                prepare(profile, options)
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                bench(profile, options)
+                timings.append((time.perf_counter() - started) * 1000)
+            # The first run is the cold one, report its queries.
+            if queries is None:
+                queries = counter.count
+
+        timings_sorted = sorted(timings)
+        return {
+            "runs_ms": [round(timing, 3) for timing in timings],
+            "min_ms": round(timings_sorted[0], 3),
+            "median_ms": round(statistics.median(timings), 3),
+            "mean_ms": round(statistics.mean(timings), 3),
+            "p95_ms": round(timings_sorted[max(0, int(len(timings) * 0.95) - 1)], 3),
+            "max_ms": round(timings_sorted[-1], 3),
+            "queries": queries,
+        }
+
+    def get(self, url):
+        response = self.client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f"GET {url} returned {response.status_code}")
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response
+
+    # ---------- Benchmarks ----------
+    def prepare_dashboard(self, profile, options):
+        cache.clear()
+
+    def bench_dashboard(self, profile, options):
+        self.get(reverse("dashboard"))
+
+    def prepare_analytics(self, profile, options):
+        cache.clear()
+
+    def bench_analytics(self, profile, options):
+        self.get(reverse("analytics"))
+
+    def prepare_analytics_cached(self, profile, options):
+        self.get(reverse("analytics"))
+
+    def bench_analytics_cached(self, profile, options):
+        self.get(reverse("analytics"))
+
+    def prepare_analytics_charts(self, profile, options):
+        cache.clear()
+
+    def bench_analytics_charts(self, profile, options):
+        # The page fetches these in parallel, this is their total server time.
+        for chart in ANALYTICS_CHARTS:
+            self.get(reverse("analytics_chart", args=[chart]))
+
+    def prepare_import_csv(self, profile, options):
+        # Dates before the seeded history so every row is a new log.
+        first = WeightLog.objects.filter(profile=profile).order_by("date").values_list("date", flat=True).first()
+        first = first or timezone.localdate()
+        rows = ["Date,Weight (kg),Notes/Mood"]
+        for i in range(options["import_rows"], 0, -1):
+            rows.append(f"{(first - timedelta(days=i)).strftime('%d/%m/%Y')},{80 + (i % 7) * 0.1:.1f},imported")
+        self.upload = SimpleUploadedFile("benchmark.csv", "\n".join(rows).encode(), content_type="text/csv")
+
+    def bench_import_csv(self, profile, options):
+        response = self.client.post(reverse("import_logs"), {"csv_file": self.upload})
+        if response.status_code != 302:
+            raise CommandError(f"CSV import returned {response.status_code}")
+
+    def bench_export_csv(self, profile, options):
+        self.get(reverse("export_logs"))
+
+    def bench_update_streaks(self, profile, options):
+        update_streaks()
+
+    def bench_update_all_bmis(self, profile, options):
+        update_all_bmis()
+
+    def bench_seed_milestones(self, profile, options):
+        call_command("seed_milestones", stdout=StringIO())
+
+    def bench_generate_weekly_summaries(self, profile, options):
+        call_command("generate_weekly_summaries", stdout=StringIO())
+
+    # ---------- Reporting ----------
+    def compare(self, path, report):
+        with open(path) as f:
+            previous = json.load(f)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\nCompared to {path} ({previous.get('commit') or 'unknown commit'}):"))
+        for name, result in report["results"].items():
+            before = previous["results"].get(name)
+            if not before:
+                continue
+            change = (result["median_ms"] - before["median_ms"]) / before["median_ms"] * 100 if before["median_ms"] else 0
+            style = self.style.SUCCESS if change <= 0 else self.style.WARNING
+            self.stdout.write(style(
+                f"  {name:<28} {before['median_ms']:>10.2f} → {result['median_ms']:>10.2f} ms ({change:+.1f}%), "
+                f"queries {before['queries']} → {result['queries']}"
+            ))
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
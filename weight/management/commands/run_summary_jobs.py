@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+import time
+import traceback
+from weight.models import Profile, SummaryJob
+from weight.management.commands.generate_weekly_summaries import BATCH_SIZE, run_shard
+
+
+class Command(BaseCommand):
+    help = "Runs queued weekly summary jobs (see the run-weekly-summary endpoint)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run the queued jobs and exit instead of polling.")
+        parser.add_argument("--poll-interval", type=float, default=10, help="Seconds between checks for new jobs.")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        self.stdout.write("👷 Waiting for summary jobs…")
+        while True:
+            job = self.claim_next_job()
+            if job:
+                self.run_job(job, options["batch_size"])
+                continue
+            if options["once"]:
+                return
+            time.sleep(options["poll_interval"])
+
+    def claim_next_job(self):
+        """Oldest queued job, marked running. Safe with several workers polling."""
+        stale = SummaryJob.fail_stale()
+        if stale:
+            self.stderr.write(f"⚠️ Failed {stale} running job(s) whose worker stopped")
+        for job in SummaryJob.objects.filter(status=SummaryJob.QUEUED).order_by("created_at")[:5]:
+            claimed = SummaryJob.objects.filter(pk=job.pk, status=SummaryJob.QUEUED).update(
+                status=SummaryJob.RUNNING,
+                started_at=timezone.now(),
+                heartbeat_at=timezone.now(),
+                profiles_total=Profile.objects.count(),
+            )
+            if claimed:
+                job.refresh_from_db()
+                return job
+        return None
+
+    def run_job(self, job, batch_size):
+        self.stdout.write(f"▶️ Job {job.pk}: summaries for {job.week_start} → {job.week_end}")
+
+        def on_batch(result):
+            SummaryJob.objects.filter(pk=job.pk).update(
+                profiles_done=result["profiles"],
+                generated=result["generated"],
+                skipped=result["skipped"],
+                failures=result["failures"],
+                heartbeat_at=timezone.now(),
+            )
+
+        try:
+            max_id = Profile.objects.aggregate(Max("id"))["id__max"] or 0
+            result = run_shard(1, 1, max_id, job.week_start, job.week_end, batch_size, self.verbosity, on_batch)
+        except Exception:
+            result = {"profiles": 0, "generated": 0, "skipped": 0, "failures": [], "error": traceback.format_exc()}
+
+        job.profiles_done = result["profiles"]
+        job.generated = result["generated"]
+        job.skipped = result["skipped"]
+        job.failures = result["failures"]
+        job.error = result["error"] or ""
+        job.status = SummaryJob.FAILED if result["error"] else SummaryJob.DONE
+        job.finished_at = timezone.now()
+        job.save()
+
+        if job.error:
+            self.stderr.write(f"❌ Job {job.pk} failed:\n{job.error}")
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Job {job.pk}: {job.generated} generated, {job.skipped} skipped, "
+                f"{len(job.failures)} failed in {job.duration():.2f}s"
+            ))
@@ -0,0 +1,152 @@
+import random
+import time
+from datetime import datetime, time as dt_time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from weight.models import Milestone, Profile, ProfileStats, WeightLog, bmi_for
+from weight.utils import MILESTONES, check_for_achievements, invalidate_milestone_catalog, update_streaks
+
+NOTES = [
+    "Felt great 💪", "Cheat day 🍕", "Slept badly", "Leg day", "Bloated",
+    "Long walk", "Party last night 🎉", "Ate clean", "Stressed at work", "Rest day",
+]
+
+# (chance of picking it, daily kg change range) for each phase of a trajectory.
+PHASES = [
+    (0.5, (-0.15, -0.03)),   # losing
+    (0.3, (-0.02, 0.02)),    # plateau
+    (0.2, (0.02, 0.1)),      # regaining
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic users with years of daily weight logs (realistic trajectories, "
+        "missed days, notes, check-ins) and their streaks, stats and milestones, for benchmarking."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100, help="Users to create.")
+        parser.add_argument("--years", type=float, default=2, help="Years of daily logs per user.")
+        parser.add_argument("--prefix", default="synthetic", help="Username prefix, users are <prefix>-<n>.")
+        parser.add_argument("--password", default="synthetic", help="Password of every seeded user.")
+        parser.add_argument("--seed", type=int, help="Random seed, for reproducible datasets.")
+        parser.add_argument("--batch-size", type=int, default=10000, help="Logs per bulk insert.")
+        parser.add_argument("--clear", action="store_true", help="Delete previously seeded users with this prefix first.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        prefix = options["prefix"]
+        existing = User.objects.filter(username__startswith=f"{prefix}-")
+        if options["clear"]:
+            deleted, _ = existing.delete()
+            self.stdout.write(f"🧹 Deleted {deleted} rows of previously seeded data.")
+        elif existing.exists():
+            raise CommandError(f"Users named {prefix}-* already exist, pass --clear or another --prefix.")
+
+        started = time.perf_counter()
+        profiles = self.create_profiles(rng, prefix, options["users"], options["password"])
+        self.stdout.write(f"👥 Created {len(profiles)} users.")
+
+        days = round(options["years"] * 365)
+        logs = self.create_logs(rng, profiles, days, options["batch_size"])
+        self.stdout.write(f"📝 Created {logs} weight logs.")
+
+        self.ensure_milestones()
+        for profile in profiles:
+            ProfileStats.rebuild(profile.pk)
+            update_streaks(profile)
+            check_for_achievements(profile)
+        self.stdout.write("🔥 Streaks, stats and milestones updated.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Seeded {len(profiles)} users with {logs} logs in {time.perf_counter() - started:.1f}s "
+            f"(password: {options['password']!r})."
+        ))
+
+    def create_profiles(self, rng, prefix, count, password):
+        # Hashing is deliberately slow, every user shares the one hash.
+        password = make_password(password)
+        users = User.objects.bulk_create([
+            User(username=f"{prefix}-{i}", email=f"{prefix}-{i}@example.com", password=password)
+            for i in range(count)
+        ])
+        today = timezone.localdate()
+        return Profile.objects.bulk_create([
+            Profile(
+                user=user,
+                height_cm=round(rng.gauss(170, 9), 1),
+                dob=today - timedelta(days=rng.randint(18 * 365, 65 * 365)),
+                target_weight=rng.randint(55, 85),
+                gender=rng.choice("MFO"),
+            )
+            for user in users
+        ])
+
+    def create_logs(self, rng, profiles, days, batch_size):
+        total = 0
+        batch = []
+        for profile in profiles:
+            for log in self.trajectory(rng, profile, days):
+                batch.append(log)
+                if len(batch) >= batch_size:
+                    WeightLog.objects.bulk_create(batch)
+                    total += len(batch)
+                    batch = []
+        WeightLog.objects.bulk_create(batch)
+        return total + len(batch)
+
+    def trajectory(self, rng, profile, days):
+        """Yields a profile's logs: phases of losing/plateau/regaining, daily noise and breaks."""
+        trend = 0
+        phase_left = 0
+        break_left = 0
+        weight = profile.target_weight + rng.uniform(5, 35)
+        first_day = timezone.localdate() - timedelta(days=days - 1)
+        weekly_rhythm = [rng.uniform(-0.3, 0.3) for _ in range(7)]
+
+        for offset in range(days):
+            day = first_day + timedelta(days=offset)
+            if phase_left <= 0:
+                trend = rng.uniform(*rng.choices([p[1] for p in PHASES], [p[0] for p in PHASES])[0])
+                phase_left = rng.randint(14, 90)
+            phase_left -= 1
+            weight = max(40, weight + trend)
+
+            # Holidays and lost motivation, a run of days without logs.
+            if break_left:
+                break_left -= 1
+                continue
+            if rng.random() < 0.01:
+                break_left = rng.randint(1, 20)
+                continue
+            if rng.random() < 0.1:
+                continue
+
+            notes = rng.choice(NOTES) if rng.random() < 0.25 else ""
+            if rng.random() < 0.03:
+                # Just a note, no weigh-in.
+                yield WeightLog(profile=profile, date=day, notes=notes or rng.choice(NOTES))
+                continue
+
+            logged = round(weight + weekly_rhythm[day.weekday()] + rng.gauss(0, 0.3), 1)
+            check_in = rng.random() < 0.85
+            check_in_at = datetime.combine(day, dt_time(rng.randint(5, 10), rng.randint(0, 59)))
+            yield WeightLog(
+                profile=profile,
+                date=day,
+                weight=logged,
+                bmi=bmi_for(logged, profile.height_cm),
+                notes=notes,
+                check_in=check_in,
+                check_in_at=timezone.make_aware(check_in_at) if check_in else None,
+            )
+
+    def ensure_milestones(self):
+        if not Milestone.objects.exists():
+            Milestone.objects.bulk_create([Milestone(**milestone) for milestone in MILESTONES])
+        invalidate_milestone_catalog()
@@ -0,0 +1,267 @@
+"""
+Operational metrics, served in the Prometheus text format at /metrics/.
+
+Counters and histograms live in the worker process that recorded them, every
+sample carries a `worker` (pid) label so scrapes landing on different gunicorn
+workers don't look like counter resets, sum them over `worker` in queries.
+Weekly summary jobs run in their own process, their numbers are read from the
+SummaryJob rows at scrape time instead.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.db import DatabaseError, connection
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import SummaryJob
+
+# Upper bounds, in seconds and in queries per request.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Seconds a database health check is reused for, by /metrics/ and the health pages.
+HEALTH_CHECK_TTL = 15
+
+WORKER = str(os.getpid())
+
+# Anything else a client sends is counted as "other", labels mustn't grow without bound.
+HTTP_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+
+class Metric:
+    def __init__(self, name, kind, help_text, labels):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def label_text(self, values, extra=()):
+        pairs = [*zip(self.labels, values), ("worker", WORKER), *extra]
+        return ",".join(f'{name}="{escape(value)}"' for name, value in pairs)
+
+
+class Counter(Metric):
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, "counter", help_text, labels)
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = list(self.values.items())
+        for labels, value in values:
+            yield f"{self.name}{{{self.label_text(labels)}}} {format_value(value)}"
+
+
+class Histogram(Metric):
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, "histogram", help_text, labels)
+        self.buckets = buckets
+
+    def observe(self, value, *labels):
+        with self.lock:
+            # Per bucket (and +Inf) counts, summed into cumulative ones on output.
+            counts, total = self.values.get(labels, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self.values[labels] = (counts, total + value)
+
+    def samples(self):
+        with self.lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self.values.items()]
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = (("le", format_value(bound)),)
+                yield f"{self.name}_bucket{{{self.label_text(labels, le)}}} {cumulative}"
+            yield f"{self.name}_sum{{{self.label_text(labels)}}} {format_value(total)}"
+            yield f"{self.name}_count{{{self.label_text(labels)}}} {cumulative}"
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+REQUEST_SECONDS = Histogram(
+    "tracc_request_duration_seconds", "Time spent in the view and middleware, per URL name.",
+    labels=("view", "method"),
+)
+RESPONSES = Counter(
+    "tracc_responses_total", "Responses per URL name and status code.", labels=("view", "method", "status"),
+)
+REQUEST_QUERIES = Histogram(
+    "tracc_request_db_queries", "SQL statements run per request.",
+    labels=("view",), buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_SECONDS = Histogram(
+    "tracc_request_db_seconds", "Time spent in the database per request.", labels=("view",),
+)
+CACHE_LOOKUPS = Counter(
+    "tracc_cache_lookups_total", "Cached result lookups by cache name, hit or miss.", labels=("cache", "result"),
+)
+LOG_ROWS = Counter(
+    "tracc_log_rows_total", "Weight log rows imported, ingested or exported.", labels=("operation",),
+)
+LOG_ROWS_SECONDS = Counter(
+    "tracc_log_rows_seconds_total", "Time spent importing, ingesting or exporting log rows.", labels=("operation",),
+)
+
+REGISTRY = [REQUEST_SECONDS, RESPONSES, REQUEST_QUERIES, REQUEST_DB_SECONDS, CACHE_LOOKUPS, LOG_ROWS, LOG_ROWS_SECONDS]
+
+
+def record_cache_lookup(cache_name, hit):
+    CACHE_LOOKUPS.inc(cache_name, "hit" if hit else "miss")
+
+
+def record_log_rows(operation, rows, seconds):
+    LOG_ROWS.inc(operation, amount=rows)
+    LOG_ROWS_SECONDS.inc(operation, amount=seconds)
+
+
+class QueryTimer:
+    """Execute wrapper counting the statements of one request and the time they took."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.seconds += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Times every request and its SQL, labelled with the URL name it resolved to."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        seconds = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = (match.view_name if match else None) or "<unresolved>"
+        method = request.method if request.method in HTTP_METHODS else "other"
+        REQUEST_SECONDS.observe(seconds, view, method)
+        RESPONSES.inc(view, method, str(response.status_code))
+        REQUEST_QUERIES.observe(timer.queries, view)
+        REQUEST_DB_SECONDS.observe(timer.seconds, view)
+        return response
+
+
+# ---------- Database health ----------
+_health = None
+_health_checked_at = 0
+_health_lock = threading.Lock()
+
+
+def check_database():
+    started = time.perf_counter()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1;")
+        ok = True
+    except Exception:
+        ok = False
+    return {"ok": ok, "seconds": time.perf_counter() - started, "checked_at": timezone.now()}
+
+
+def database_health():
+    """Result of `SELECT 1`, reused for HEALTH_CHECK_TTL seconds so frequent probes don't hit the database."""
+    global _health, _health_checked_at
+
+    with _health_lock:
+        now = time.monotonic()
+        if _health is None or now - _health_checked_at > HEALTH_CHECK_TTL:
+            _health = check_database()
+            _health_checked_at = now
+        return _health
+
+
+def reset_database_health():
+    global _health
+    with _health_lock:
+        _health = None
+
+
+def gauge(name, help_text, samples):
+    """Exposition lines of a gauge from (labels dict, value) pairs, computed at scrape time."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        label_text = ",".join(f'{key}="{escape(label)}"' for key, label in labels.items())
+        lines.append(f"{name}{{{label_text}}} {format_value(value)}" if label_text else f"{name} {format_value(value)}")
+    return lines
+
+
+def database_lines(health):
+    return [
+        *gauge("tracc_database_up", "Whether the last health check reached the database.", [({}, int(health["ok"]))]),
+        *gauge("tracc_database_check_seconds", "How long the last health check took.", [({}, health["seconds"])]),
+        *gauge(
+            "tracc_database_checked_timestamp_seconds", "When the last health check ran.",
+            [({}, health["checked_at"].timestamp())],
+        ),
+    ]
+
+
+def summary_job_lines():
+    """The weekly summary jobs by status and how the last finished one went."""
+    by_status = dict(SummaryJob.objects.order_by().values_list("status").annotate(Count("id")))
+    lines = gauge(
+        "tracc_summary_jobs", "Weekly summary jobs per status.",
+        [({"status": status}, by_status.get(status, 0)) for status, _ in SummaryJob.STATUS_CHOICES],
+    )
+
+    job = (
+        SummaryJob.objects.filter(status__in=[SummaryJob.DONE, SummaryJob.FAILED], finished_at__isnull=False)
+        .order_by("-finished_at").first()
+    )
+    if job:
+        labels = {"status": job.status, "week_start": job.week_start.isoformat()}
+        lines += gauge("tracc_summary_job_last_duration_seconds", "Run time of the last finished job.",
+                       [(labels, job.duration())])
+        lines += gauge("tracc_summary_job_last_failures", "Profiles the last finished job couldn't summarise.",
+                       [(labels, len(job.failures))])
+        lines += gauge("tracc_summary_job_last_generated", "Summaries the last finished job wrote.",
+                       [(labels, job.generated)])
+        lines += gauge("tracc_summary_job_last_finished_timestamp_seconds", "When the last job finished.",
+                       [(labels, job.finished_at.timestamp())])
+    return lines
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {metric.kind}"]
+        lines += metric.samples()
+
+    health = database_health()
+    lines += database_lines(health)
+    # With the database down the health gauge already says so, there are no job numbers to add.
+    if health["ok"]:
+        try:
+            lines += summary_job_lines()
+        except DatabaseError:
+            pass
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weight', '0008_weeklysummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='last_check_in',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:00
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+UNIQUE_CONSTRAINT = models.UniqueConstraint(fields=('profile', 'date'), name='weightlog_profile_date_uniq')
+CHECKIN_INDEX = models.Index(condition=models.Q(('check_in', True)), fields=['profile', 'check_in_at'], name='weightlog_checkin_idx')
+
+
+def dedupe_weight_logs(apps, schema_editor):
+    # Keep the most recently written log for every (profile, date) pair, with
+    # the day's earliest check-in, its latest weight and all of its notes.
+    WeightLog = apps.get_model('weight', 'WeightLog')
+    duplicates = (
+        WeightLog.objects.order_by()
+        .values('profile_id', 'date')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+    )
+    removed = 0
+    for row in duplicates:
+        logs = list(WeightLog.objects.filter(profile_id=row['profile_id'], date=row['date']).order_by('id'))
+        keep = logs[-1]
+
+        weighed = [log for log in logs if log.weight is not None]
+        if weighed:
+            keep.weight, keep.bmi = weighed[-1].weight, weighed[-1].bmi
+        check_ins = [log for log in logs if log.check_in]
+        if check_ins:
+            keep.check_in = True
+            keep.check_in_at = min((log.check_in_at for log in check_ins if log.check_in_at), default=None)
+        keep.notes = '\n'.join(dict.fromkeys(log.notes for log in logs if log.notes)) or keep.notes
+        keep.save()
+
+        WeightLog.objects.filter(id__in=[log.id for log in logs[:-1]]).delete()
+        removed += len(logs) - 1
+
+    if removed:
+        print(f'\n  Merged {removed} duplicate weight logs into the log kept for their day.')
+
+
+def create_indexes(apps, schema_editor):
+    WeightLog = apps.get_model('weight', 'WeightLog')
+    table = schema_editor.quote_name(WeightLog._meta.db_table)
+
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.execute(UNIQUE_CONSTRAINT.create_sql(WeightLog, schema_editor))
+        schema_editor.add_index(WeightLog, CHECKIN_INDEX)
+        return
+
+    # Build both indexes without locking the table against writes, then
+    # promote the unique index to a constraint (a metadata-only change).
+    schema_editor.execute(
+        f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS weightlog_profile_date_uniq '
+        f'ON {table} ("profile_id", "date")'
+    )
+    schema_editor.execute(
+        f'ALTER TABLE {table} ADD CONSTRAINT weightlog_profile_date_uniq '
+        f'UNIQUE USING INDEX weightlog_profile_date_uniq'
+    )
+    schema_editor.execute(
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS weightlog_checkin_idx '
+        f'ON {table} ("profile_id", "check_in_at") WHERE "check_in"'
+    )
+
+
+def drop_indexes(apps, schema_editor):
+    WeightLog = apps.get_model('weight', 'WeightLog')
+    schema_editor.remove_index(WeightLog, CHECKIN_INDEX)
+    schema_editor.execute(UNIQUE_CONSTRAINT.remove_sql(WeightLog, schema_editor))
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('weight', '0009_profile_last_check_in'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_weight_logs, migrations.RunPython.noop, atomic=True),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='weightlog', index=CHECKIN_INDEX),
+                migrations.AddConstraint(model_name='weightlog', constraint=UNIQUE_CONSTRAINT),
+            ],
+            database_operations=[
+                migrations.RunPython(create_indexes, drop_indexes),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weight', '0012_summaryjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileStats',
+            fields=[
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='weight.profile')),
+                ('start_weight', models.FloatField(blank=True, null=True)),
+                ('current_weight', models.FloatField(blank=True, null=True)),
+                ('min_weight', models.FloatField(blank=True, null=True)),
+                ('max_weight', models.FloatField(blank=True, null=True)),
+                ('current_bmi', models.FloatField(blank=True, null=True)),
+                ('min_bmi', models.FloatField(blank=True, null=True)),
+                ('log_count', models.IntegerField(default=0)),
+                ('first_log_date', models.DateField(blank=True, null=True)),
+                ('last_log_date', models.DateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weight', '0013_profilestats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='data_changed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
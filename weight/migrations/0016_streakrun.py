@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_streak_runs(apps, schema_editor):
+    # Same runs as weight.utils.update_streaks builds, from every profile's check-ins.
+    WeightLog = apps.get_model('weight', 'WeightLog')
+    StreakRun = apps.get_model('weight', 'StreakRun')
+    check_ins = (
+        WeightLog.objects.filter(check_in=True, weight__isnull=False, check_in_at__isnull=False)
+        .order_by('profile_id', 'check_in_at').values_list('profile_id', 'check_in_at')
+    )
+    runs = []
+    for profile_id, check_in_at in check_ins.iterator(chunk_size=5000):
+        day = check_in_at.date()
+        run = runs[-1] if runs and runs[-1].profile_id == profile_id else None
+        if run and day == run.end:
+            continue
+        if run and (day - run.end).days <= 2:
+            run.end = day
+            run.length += 1
+        else:
+            runs.append(StreakRun(profile_id=profile_id, start=day, end=day, length=1))
+    StreakRun.objects.bulk_create(runs, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weight', '0015_apitoken_ingestedreading'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StreakRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateField()),
+                ('end', models.DateField()),
+                ('length', models.PositiveIntegerField(default=1)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='weight.profile')),
+            ],
+            options={
+                'ordering': ['start'],
+                'constraints': [models.UniqueConstraint(fields=('profile', 'start'), name='streakrun_profile_start_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_streak_runs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:57
+
+from django.db import migrations, models
+
+
+# Milestones seeded under the old categories (get_or_create never rewrote them).
+RECATEGORISED = {
+    'Target Maintainer': {'category': 'target_maintain', 'value': 30},
+    'Obese Crusher': {'category': 'bmi_transition', 'value': 30},
+    'Overweight Slayer': {'category': 'bmi_transition', 'value': 25},
+}
+
+
+def recategorise_milestones(apps, schema_editor):
+    Milestone = apps.get_model('weight', 'Milestone')
+    for title, fields in RECATEGORISED.items():
+        Milestone.objects.filter(title=title).update(**fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weight', '0016_streakrun'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='milestone',
+            name='category',
+            field=models.CharField(choices=[('weight_loss', 'Weight Loss'), ('bmi', 'BMI'), ('bmi_transition', 'BMI Transition'), ('streak', 'Streak'), ('target_weight', 'Target Weight'), ('target_maintain', 'Target Maintenance'), ('log_count', 'Consistency')], max_length=50),
+        ),
+        migrations.RunPython(recategorise_milestones, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,12 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Round
 from django.contrib.auth.models import User
-from datetime import date
+from django.utils import timezone
+from datetime import date, timedelta
+import hashlib
+import secrets
 
 class Profile(models.Model):
     GENDER_CHOICES = [
@@ -16,15 +22,78 @@ class Profile(models.Model):
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES, blank=True, null=True)
     streaks = models.IntegerField(default=0)
     streaks_from = models.DateTimeField(null=True, blank=True)
-    
+    last_check_in = models.DateField(null=True, blank=True)
+    # Bumped on every write to the profile's data, keys its cached results.
+    data_version = models.PositiveIntegerField(default=0)
+    data_changed_at = models.DateTimeField(null=True, blank=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored height, the logs' BMIs follow it.
+        if "height_cm" in field_names:
+            instance._stored_height = instance.height_cm
+        return instance
+
+    def save(self, *args, **kwargs):
+        # data_version is only ever bumped atomically in the database (see
+        # utils.bump_data_version), never written back from a stale instance.
+        if self.pk and not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ("data_version", "data_changed_at")
+            ]
+        height_changed = (
+            not self._state.adding
+            and hasattr(self, "_stored_height")
+            and self._meta.get_field("height_cm").to_python(self.height_cm) != self._stored_height
+        )
+        if height_changed:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                self.refresh_bmis()
+        else:
+            super().save(*args, **kwargs)
+        self._stored_height = self._meta.get_field("height_cm").to_python(self.height_cm)
+
+    def refresh_bmis(self):
+        """Recomputes the BMI of every log from the current height in one UPDATE."""
+        height_cm = self._meta.get_field("height_cm").to_python(self.height_cm)
+        logs = WeightLog.objects.filter(profile_id=self.pk)
+        if height_cm:
+            logs.update(bmi=Round(F("weight") / (height_cm / 100) ** 2, 2))
+        else:
+            logs.update(bmi=None)
+        ProfileStats.rebuild(self.pk)
+
     def bmi(self, current_weight=None):
         weight = current_weight if current_weight else self.current_weight()
         height_m = self.height_cm / 100
         return round(weight / (height_m**2), 2)
 
     def current_weight(self):
-        latest = self.weightlog_set.exclude(weight=None).order_by('-date').first()
-        return latest.weight if latest and latest.weight else 0
+        return ProfileStats.for_profile(self).current_weight or 0
+
+
+def bmi_for(weight, height_cm):
+    """BMI stored on a log, None without a weight or height."""
+    if weight in (None, "") or not height_cm:
+        return None
+    return round(float(weight) / (float(height_cm) / 100) ** 2, 2)
+
+
+class WeightLogQuerySet(models.QuerySet):
+    def delete(self):
+        """Deletes the logs, then rebuilds the stats of every profile that had one of them."""
+        with transaction.atomic():
+            profile_ids = set(self.order_by().values_list("profile_id", flat=True).distinct())
+            result = super().delete()
+            for profile_id in profile_ids:
+                ProfileStats.rebuild(profile_id)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
 
 
 class WeightLog(models.Model):
@@ -36,20 +105,199 @@ class WeightLog(models.Model):
     check_in_at = models.DateTimeField(null=True, blank=True)
     bmi = models.FloatField(blank=True, null=True)
 
+    objects = WeightLogQuerySet.as_manager()
+
     class Meta:
         ordering = ['-date']
+        constraints = [
+            # Also serves as the (profile, date) index for the hot log queries.
+            models.UniqueConstraint(fields=['profile', 'date'], name='weightlog_profile_date_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['profile', 'check_in_at'], condition=models.Q(check_in=True), name='weightlog_checkin_idx'),
+        ]
 
     def __str__(self):
         return f"{self.profile.user.username} - {self.weight}kg on {self.date}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what's stored so ProfileStats can retract it on change.
+        if {"weight", "bmi", "date"} <= set(field_names):
+            instance._stored_stats = instance.stats_values()
+        return instance
+
+    def stats_values(self):
+        """(weight, bmi, date) as ProfileStats counts them."""
+        weight = None if self.weight in (None, "") else float(self.weight)
+        bmi = None if self.bmi in (None, "") else float(self.bmi)
+        return weight, bmi, self._meta.get_field("date").to_python(self.date)
+
+    def save(self, *args, **kwargs):
+        # Always derived from the weight and the profile's current height.
+        self.bmi = bmi_for(self.weight, self.profile.height_cm)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "weight" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "bmi"}
+        stored = None if self._state.adding else getattr(self, "_stored_stats", ProfileStats.UNKNOWN)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            ProfileStats.log_written(self.profile_id, stored, self.stats_values())
+        self._stored_stats = self.stats_values()
+
+    def delete(self, *args, **kwargs):
+        stored = getattr(self, "_stored_stats", ProfileStats.UNKNOWN)
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            ProfileStats.log_written(self.profile_id, stored, None)
+        return result
+
+
+class ProfileStats(models.Model):
+    """
+    Denormalised summary of a profile's weighed logs, kept in step with every
+    WeightLog save/delete so hot paths never scan the history.
+
+    Instance save()/delete() apply the change incrementally and QuerySet.delete()
+    rebuilds the profiles it touched. QuerySet.update(), bulk_create() and
+    bulk_update() of logs skip both, code using them calls `rebuild` afterwards
+    (or `refresh_bmis` when only BMIs changed).
+    """
+    # Stored values of a log that wasn't loaded from the database.
+    UNKNOWN = object()
+
+    profile = models.OneToOneField(Profile, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    start_weight = models.FloatField(null=True, blank=True)
+    current_weight = models.FloatField(null=True, blank=True)
+    min_weight = models.FloatField(null=True, blank=True)
+    max_weight = models.FloatField(null=True, blank=True)
+    current_bmi = models.FloatField(null=True, blank=True)
+    min_bmi = models.FloatField(null=True, blank=True)
+    log_count = models.IntegerField(default=0)
+    first_log_date = models.DateField(null=True, blank=True)
+    last_log_date = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.profile.user.username} - {self.log_count} logs"
+
+    @classmethod
+    def for_profile(cls, profile):
+        try:
+            return profile.stats
+        except cls.DoesNotExist:
+            return cls.rebuild(profile.pk)
+
+    @classmethod
+    def rebuild(cls, profile_id):
+        """Recomputes the stats from the logs, a few index-backed queries."""
+        logs = WeightLog.objects.filter(profile_id=profile_id, weight__isnull=False)
+        totals = logs.aggregate(
+            log_count=Count("id"),
+            min_weight=Min("weight"),
+            max_weight=Max("weight"),
+            min_bmi=Min("bmi"),
+            first_log_date=Min("date"),
+            last_log_date=Max("date"),
+        )
+        first = logs.order_by("date").values("weight").first() or {}
+        last = logs.order_by("-date").values("weight", "bmi").first() or {}
+
+        stats, _ = cls.objects.update_or_create(
+            profile_id=profile_id,
+            defaults={
+                **totals,
+                "start_weight": first.get("weight"),
+                "current_weight": last.get("weight"),
+                "current_bmi": last.get("bmi"),
+            },
+        )
+        return stats
+
+    @classmethod
+    def refresh_bmis(cls):
+        """Re-reads current and lowest BMI of every profile from its logs, in one UPDATE."""
+        logs = WeightLog.objects.filter(profile_id=OuterRef("profile_id"), weight__isnull=False)
+        cls.objects.update(
+            current_bmi=Subquery(logs.order_by("-date").values("bmi")[:1]),
+            min_bmi=Subquery(logs.order_by().values("profile_id").annotate(min_bmi=Min("bmi")).values("min_bmi")),
+        )
+
+    @classmethod
+    def log_written(cls, profile_id, stored, new):
+        """
+        Applies a log write in O(1): retracts the `stored` (weight, bmi, date),
+        adds the `new` one. Falls back to a rebuild when the retracted log may
+        have been an extreme (min/max, first/last).
+        """
+        stats = cls.objects.select_for_update().filter(profile_id=profile_id).first()
+        if stats is None or stored is cls.UNKNOWN:
+            return cls.rebuild(profile_id)
+        replaced_on = new[2] if new and new[0] is not None else None
+        if stored and not stats._retract(*stored, replaced_on=replaced_on):
+            return cls.rebuild(profile_id)
+        if new:
+            stats._add(*new)
+        stats.save()
+        return stats
+
+    def _retract(self, weight, bmi, log_date, replaced_on=None):
+        if weight is None:
+            return True
+        if weight in (self.min_weight, self.max_weight):
+            return False
+        # A first/last log rewritten on the same date takes its place again in _add.
+        if log_date != replaced_on and log_date in (self.first_log_date, self.last_log_date):
+            return False
+        if bmi is not None and bmi == self.min_bmi:
+            return False
+        self.log_count -= 1
+        return True
+
+    def _add(self, weight, bmi, log_date):
+        if weight is None:
+            return
+        self.log_count += 1
+        self.min_weight = weight if self.min_weight is None else min(self.min_weight, weight)
+        self.max_weight = weight if self.max_weight is None else max(self.max_weight, weight)
+        if bmi is not None:
+            self.min_bmi = bmi if self.min_bmi is None else min(self.min_bmi, bmi)
+        if self.last_log_date is None or log_date >= self.last_log_date:
+            self.current_weight, self.current_bmi, self.last_log_date = weight, bmi, log_date
+        if self.first_log_date is None or log_date <= self.first_log_date:
+            self.start_weight, self.first_log_date = weight, log_date
+
+
+class StreakRun(models.Model):
+    """
+    A run of check-in days a streak was kept over (a 1 or 2 day gap continues
+    it), kept in step by `update_streaks` and `advance_streak`.
+    """
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE)
+    start = models.DateField()
+    end = models.DateField()
+    length = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        ordering = ["start"]
+        constraints = [
+            models.UniqueConstraint(fields=["profile", "start"], name="streakrun_profile_start_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.profile.user.username} - {self.length} check-ins from {self.start} to {self.end}"
+
 
 class Milestone(models.Model):
     CATEGORY_CHOICES = [
         ("weight_loss", "Weight Loss"),
         ("bmi", "BMI"),
+        ("bmi_transition", "BMI Transition"),
         ("streak", "Streak"),
-        ("target", "Target"),
-        ("consistency", "Consistency"),
+        ("target_weight", "Target Weight"),
+        ("target_maintain", "Target Maintenance"),
+        ("log_count", "Consistency"),
     ]
 
     title = models.CharField(max_length=100)
@@ -97,3 +345,107 @@ class WeeklySummary(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.week_start} to {self.week_end}"
+
+
+class SummaryJob(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    week_start = models.DateField()
+    week_end = models.DateField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+
+    profiles_total = models.IntegerField(default=0)
+    profiles_done = models.IntegerField(default=0)
+    generated = models.IntegerField(default=0)
+    skipped = models.IntegerField(default=0)
+    failures = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Moved on by the worker after every batch, a running job that stops beating lost its worker.
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        constraints = [
+            # One queued, running or finished run per week, failed ones can be retried.
+            models.UniqueConstraint(
+                fields=["week_start", "week_end"],
+                condition=~models.Q(status="failed"),
+                name="summaryjob_week_uniq",
+            ),
+        ]
+
+    @classmethod
+    def fail_stale(cls):
+        """
+        Marks running jobs without a heartbeat for SUMMARY_JOB_TIMEOUT seconds failed,
+        which lets their week be queued again. Returns how many there were.
+        """
+        now = timezone.now()
+        cutoff = now - timedelta(seconds=settings.SUMMARY_JOB_TIMEOUT)
+        return cls.objects.filter(
+            models.Q(heartbeat_at__lt=cutoff) | models.Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+            status=cls.RUNNING,
+        ).update(
+            status=cls.FAILED,
+            error=f"No heartbeat for {settings.SUMMARY_JOB_TIMEOUT} seconds, the worker running it stopped.",
+            finished_at=now,
+        )
+
+    def duration(self):
+        if not self.started_at:
+            return None
+        return ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+
+    def __str__(self):
+        return f"Summary job {self.week_start} to {self.week_end} ({self.status})"
+
+
+class ApiToken(models.Model):
+    """Lets scales and health apps push readings for a user. Only a hash of the key is kept."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="api_tokens")
+    name = models.CharField(max_length=100)
+    key_hash = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(null=True, blank=True)
+
+    @staticmethod
+    def hash_key(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    @classmethod
+    def issue(cls, user, name):
+        """Creates a token, returns it with its key, which can't be read back later."""
+        key = secrets.token_urlsafe(32)
+        return cls.objects.create(user=user, name=name, key_hash=cls.hash_key(key)), key
+
+    def __str__(self):
+        return f"{self.user.username} - {self.name}"
+
+
+class IngestedReading(models.Model):
+    """Idempotency keys of readings pushed through the ingest API, a resent reading is skipped."""
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE)
+    key = models.CharField(max_length=100)
+    date = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["profile", "key"], name="ingestedreading_key_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.profile.user.username} - {self.key}"
@@ -0,0 +1,29 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Milestone, Profile, UserMilestone, WeeklySummary, WeightLog
+from .utils import bump_all_data_versions, bump_data_version, invalidate_milestone_catalog
+
+
+@receiver([post_save, post_delete], sender=Milestone)
+def milestone_changed(sender, **kwargs):
+    invalidate_milestone_catalog()
+    # Titles and descriptions show on every profile's pages, their ETags must change too.
+    bump_all_data_versions()
+
+
+@receiver([post_save, post_delete], sender=WeightLog)
+@receiver([post_save, post_delete], sender=UserMilestone)
+def profile_data_changed(sender, instance, **kwargs):
+    bump_data_version(instance.profile_id)
+
+
+@receiver(post_save, sender=Profile)
+def profile_changed(sender, instance, created, **kwargs):
+    if not created:
+        bump_data_version(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=WeeklySummary)
+def weekly_summary_changed(sender, instance, **kwargs):
+    bump_data_version(user_id=instance.user_id)
@@ -1,3 +1,996 @@
+import json
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+from datetime import datetime, time as dt_time, timedelta
+from io import StringIO
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .management.commands.bench_line_data import pandas_daily_series
+from .management.commands.generate_weekly_summaries import Command as GenerateWeeklySummaries, shard_id_range
+from .metrics import reset_database_health
+from .models import (
+    ApiToken, Milestone, Profile, ProfileStats, StreakRun, SummaryJob, UserMilestone, WeeklySummary, WeightLog, bmi_for,
+)
+from .utils import (
+    ImportFileError, Insights, advance_streak, cached_for_profile, check_for_achievements, import_weight_logs,
+    invalidate_milestone_catalog, last_week, sync_milestone_catalog, update_all_bmis, update_streaks,
+)
+from .views import ANALYTICS_CHARTS, analytics_logs, get_logs_page
+
+APP_DIR = Path(__file__).resolve().parent
+DJANGO_DIR = Path(django.__file__).resolve().parent
+
+
+@lru_cache(maxsize=None)
+def _resolve(filename):
+    return Path(filename).resolve()
+
+
+def call_site():
+    """Innermost app frame (outside the tests) that led to the current query."""
+    fallback = None
+    frame = sys._getframe(1)
+    while frame:
+        path = _resolve(frame.f_code.co_filename)
+        if APP_DIR in path.parents and path.name != "tests.py":
+            return f"{path.relative_to(APP_DIR.parent)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        # Middleware and the like, name the caller above the ORM.
+        if fallback is None and DJANGO_DIR in path.parents and DJANGO_DIR / "db" not in path.parents:
+            fallback = f"django/{path.relative_to(DJANGO_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return fallback or "<unknown>"
+
+
+class QueryRecorder:
+    """Execute wrapper collecting every SQL statement with the code that issued it."""
+
+    def __init__(self):
+        self.queries = []
+        self.seconds = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((call_site(), sql))
+        return execute(sql, params, many, context)
+
+    def report(self):
+        by_site = defaultdict(list)
+        for site, sql in self.queries:
+            by_site[site].append(sql)
+
+        lines = []
+        for site, statements in sorted(by_site.items(), key=lambda item: -len(item[1])):
+            lines.append(f"  {len(statements)}x {site}")
+            for sql in dict.fromkeys(statements):
+                lines.append(f"      {sql[:300]}")
+        return "\n".join(lines)
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Seeds a profile with a year of logs. Use `assertQueryBudget` around the code
+    under test, failures list the SQL grouped by the line that issued it.
+    """
+    DAYS = 365
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command("seed_milestones", stdout=StringIO())
+        cls.user, cls.profile = cls.create_profile("budget")
+        cls.seed_logs(cls.profile, cls.DAYS)
+
+    @classmethod
+    def create_profile(cls, username):
+        user = User.objects.create_user(username=username, password="budget-pass")
+        profile = Profile.objects.create(user=user, height_cm=172, target_weight=70, gender="M")
+        return user, profile
+
+    @classmethod
+    def seed_logs(cls, profile, days):
+        """Daily logs with some gaps in the weights, mostly clocked in."""
+        rng = random.Random(profile.pk)
+        today = timezone.localdate()
+        first_day = today - timedelta(days=days)
+        weight = 92.0
+        logs = []
+        for i in range(days):
+            log_date = first_day + timedelta(days=i)
+            weight += rng.uniform(-0.35, 0.3)
+            weighed = rng.random() < 0.9
+            check_in = weighed and rng.random() < 0.8
+            logs.append(WeightLog(
+                profile=profile,
+                date=log_date,
+                weight=round(weight, 1) if weighed else None,
+                bmi=round(weight / 1.72 ** 2, 2) if weighed else None,
+                notes=rng.choice(["", "Felt good", "Cheat day"]),
+                check_in=check_in,
+                check_in_at=timezone.make_aware(datetime.combine(log_date, dt_time(7, 30))) if check_in else None,
+            ))
+        WeightLog.objects.bulk_create(logs)
+        ProfileStats.rebuild(profile.pk)
+        update_streaks(profile)
+
+        # An unread summary, the dashboard charts it too.
+        week_start, week_end = last_week()
+        WeeklySummary.objects.create(
+            user_id=profile.user_id, week_start=week_start, week_end=week_end,
+            avg_weight=weight, bmi_status="Overweight", streak=5,
+        )
+
+    def setUp(self):
+        # Start every test cold, cached results would hide the queries.
+        cache.clear()
+        invalidate_milestone_catalog()
+        self.client.force_login(self.user)
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries, max_seconds=1.0):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            yield recorder
+        recorder.seconds = time.perf_counter() - started
+
+        problems = []
+        if len(recorder.queries) > max_queries:
+            problems.append(f"{len(recorder.queries)} queries, budget is {max_queries}")
+        if recorder.seconds > max_seconds:
+            problems.append(f"took {recorder.seconds:.3f}s, budget is {max_seconds}s")
+        if problems:
+            self.fail(f"Over budget: {', '.join(problems)}\n{recorder.report()}")
+
+    def assertOk(self, response, status=200):
+        self.assertEqual(response.status_code, status, getattr(response, "content", b"")[:500])
+
+
+class ViewQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_dashboard(self):
+        with self.assertQueryBudget(10):
+            response = self.client.get(reverse("dashboard"))
+        self.assertOk(response)
+
+    def test_analytics(self):
+        with self.assertQueryBudget(9):
+            response = self.client.get(reverse("analytics"))
+        self.assertOk(response)
+
+        # Repeat visits are served from the cache.
+        with self.assertQueryBudget(3):
+            response = self.client.get(reverse("analytics"))
+        self.assertOk(response)
+
+    def test_analytics_charts(self):
+        for chart in ANALYTICS_CHARTS:
+            url = reverse("analytics_chart", args=[chart])
+            with self.assertQueryBudget(5):
+                response = self.client.get(url)
+            self.assertOk(response)
+
+            with self.assertQueryBudget(3):
+                response = self.client.get(url)
+            self.assertOk(response)
+
+        self.assertOk(self.client.get(reverse("analytics_chart", args=["nope"])), 404)
+
+    def test_analytics_calendar(self):
+        today = timezone.localdate()
+        month = {"start": today.replace(day=1).isoformat(), "end": (today.replace(day=1) + timedelta(days=42)).isoformat()}
+        with self.assertQueryBudget(5):
+            response = self.client.get(reverse("analytics_calendar"), month)
+        self.assertOk(response)
+
+        # Every check-in of the month shows, as part of a streak or on its own.
+        check_in_days = {
+            check_in_at.date().isoformat()
+            for check_in_at in WeightLog.objects.filter(
+                profile=self.profile, check_in=True, check_in_at__date__gte=month["start"],
+            ).values_list("check_in_at", flat=True)
+        }
+        checked_in = {event["date"] for event in response.json() if event["type"] != "restored"}
+        self.assertLessEqual(check_in_days, checked_in)
+
+        # The day a 2 day gap skipped is shown restored, not as a check-in.
+        user, profile = self.create_profile("calendar")
+        first_day = today.replace(day=1) - timedelta(days=20)
+        for offset in (0, 1, 3, 10):
+            day = first_day + timedelta(days=offset)
+            WeightLog.objects.create(
+                profile=profile, date=day, weight=80, check_in=True,
+                check_in_at=timezone.make_aware(datetime.combine(day, dt_time(12))),
+            )
+        update_streaks(profile)
+        self.client.force_login(user)
+        response = self.client.get(reverse("analytics_calendar"), {
+            "start": first_day.isoformat(), "end": (first_day + timedelta(days=30)).isoformat(),
+        })
+        self.assertEqual(
+            [(event["date"], event["type"]) for event in response.json()],
+            [
+                ((first_day + timedelta(days=offset)).isoformat(), event_type)
+                for offset, event_type in ((0, "streak"), (1, "streak"), (2, "restored"), (3, "streak"), (10, "checkin"))
+            ],
+        )
+
+        self.assertOk(self.client.get(reverse("analytics_calendar"), {"start": "2020-01-01", "end": "2021-01-01"}), 400)
+
+    def test_streak_runs_follow_check_ins(self):
+        WeightLog.objects.filter(profile=self.profile, date=timezone.localdate()).delete()
+        self.client.post(reverse("clock_in"), {"weight": "78.4", "check_in": "true"})
+        advanced = list(StreakRun.objects.filter(profile=self.profile).values_list("start", "end", "length"))
+
+        update_streaks(Profile.objects.get(pk=self.profile.pk))
+        rebuilt = list(StreakRun.objects.filter(profile=self.profile).values_list("start", "end", "length"))
+        self.assertEqual(advanced, rebuilt)
+        self.assertEqual(Profile.objects.get(pk=self.profile.pk).streaks, rebuilt[-1][2])
+
+    def test_weightlog_list(self):
+        with self.assertQueryBudget(4):
+            response = self.client.get(reverse("weightlog_list"))
+        self.assertOk(response)
+
+        cursor = response.context["next_cursor"]
+        with self.assertQueryBudget(4):
+            response = self.client.get(reverse("weightlog_page"), {"cursor": cursor})
+        self.assertOk(response)
+
+    def test_revalidate_unchanged_pages(self):
+        # The first render hands out the CSRF cookie, which is part of the ETag.
+        self.client.get(reverse("dashboard"))
+        for url in (reverse("dashboard"), reverse("analytics"), reverse("weightlog_list")):
+            etag = self.client.get(url)["ETag"]
+            with self.assertQueryBudget(3):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertOk(response, 304)
+
+        # The pages show milestone titles, editing the catalog changes every ETag.
+        etag = self.client.get(reverse("dashboard"))["ETag"]
+        milestone = Milestone.objects.first()
+        milestone.description = "Reworded"
+        milestone.save()
+        self.assertOk(self.client.get(reverse("dashboard"), HTTP_IF_NONE_MATCH=etag))
+
+    def test_clock_in(self):
+        WeightLog.objects.filter(profile=self.profile, date=timezone.localdate()).delete()
+        self.profile.refresh_from_db()
+        version = self.profile.data_version
+        with self.assertQueryBudget(16) as recorder:
+            response = self.client.post(reverse("clock_in"), {"weight": "78.4", "check_in": "true"})
+        self.assertOk(response, 302)
+        # One write for the log, and the pages showing it moved on once for the log, streak and milestones.
+        self.assertEqual(sum(sql.startswith("INSERT INTO \"weight_weightlog\"") for _, sql in recorder.queries), 1)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.data_version, version + 1)
+        log = WeightLog.objects.get(profile=self.profile, date=timezone.localdate())
+        self.assertEqual(log.bmi, bmi_for(log.weight, self.profile.height_cm))
+
+    def test_add_weight_log(self):
+        WeightLog.objects.filter(profile=self.profile, date=timezone.localdate()).delete()
+        with self.assertQueryBudget(10):
+            response = self.client.post(reverse("add_weight_log"), {"weight": "78.4", "notes": "After the run"})
+        self.assertOk(response, 302)
+
+    def test_sync_weight_logs(self):
+        # A month of clock-ins made offline, flushed as one batch.
+        today = timezone.localdate()
+        WeightLog.objects.filter(profile=self.profile, date__gt=today - timedelta(days=30)).delete()
+        entries = [
+            {
+                "id": f"entry-{i}",
+                "date": (today - timedelta(days=i)).isoformat(),
+                "recorded_at": timezone.make_aware(datetime.combine(today - timedelta(days=i), dt_time(7, 45))).isoformat(),
+                "weight": f"{80 - i * 0.1:.1f}",
+                "check_in": True,
+            }
+            for i in range(30)
+        ]
+        # An edit of an older log and entries rejected without touching the rest of the batch.
+        edited = WeightLog.objects.filter(profile=self.profile, date__lt=today - timedelta(days=30)).first()
+        now = timezone.now().isoformat()
+        entries += [
+            {"id": "edit", "log_id": str(edited.pk), "date": edited.date.isoformat(), "recorded_at": now, "weight": "81.5", "notes": "Edited offline"},
+            {"id": "bad", "date": today.isoformat(), "recorded_at": now, "weight": "heavy"},
+            {"id": "bad-log", "log_id": "12abc", "date": today.isoformat(), "recorded_at": now, "weight": "80"},
+            {"id": "gone", "log_id": 10 ** 9, "date": today.isoformat(), "recorded_at": now, "weight": "80"},
+            {"id": "bad-notes", "date": today.isoformat(), "recorded_at": now, "weight": "80", "notes": {"text": "x"}},
+        ]
+        body = json.dumps({"entries": entries})
+
+        # Bulk reads and writes, the same few queries for any batch size.
+        with self.assertQueryBudget(30):
+            response = self.client.post(reverse("sync_weight_logs"), body, content_type="application/json")
+        self.assertOk(response)
+        results = {result["id"]: result for result in response.json()["results"]}
+        self.assertEqual(
+            {entry_id: result["status"] for entry_id, result in results.items()},
+            {**{f"entry-{i}": "ok" for i in range(30)}, "edit": "ok", "bad": "rejected", "bad-log": "rejected", "gone": "rejected",
+             "bad-notes": "rejected"},
+        )
+        self.assertEqual(results["bad-log"]["error"], "log_id must be an integer.")
+        self.assertEqual(results["bad-notes"]["error"], "notes must be a string.")
+        self.assertEqual(results["edit"]["log_id"], edited.pk)
+        edited.refresh_from_db()
+        self.assertEqual((edited.weight, edited.notes, edited.bmi), (81.5, "Edited offline", bmi_for(81.5, 172)))
+        synced = WeightLog.objects.filter(profile=self.profile, date__gt=today - timedelta(days=30))
+        self.assertEqual(sorted(synced.values_list("id", flat=True)), sorted(results[f"entry-{i}"]["log_id"] for i in range(30)))
+        stats = ProfileStats.objects.get(profile=self.profile)
+        self.assertEqual((stats.current_weight, stats.last_log_date), (80.0, today))
+
+        # Replaying the batch (a lost response) changes nothing.
+        synced = list(synced.values())
+        streaks = Profile.objects.get(pk=self.profile.pk).streaks
+        response = self.client.post(reverse("sync_weight_logs"), body, content_type="application/json")
+        self.assertOk(response)
+        self.assertEqual(list(WeightLog.objects.filter(profile=self.profile, date__gt=today - timedelta(days=30)).values()), synced)
+        self.assertEqual(response.json()["streaks"], streaks)
+        self.assertGreaterEqual(streaks, 30)
+
+    def test_api_readings(self):
+        # Two scales' worth of history, overlapping the logged year, in one push.
+        _, key = ApiToken.issue(self.user, "Scale")
+        today = timezone.localdate()
+        readings = [
+            {"key": f"scale-{i}", "date": (today - timedelta(days=i)).isoformat(), "weight": round(90 - i * 0.001, 1)}
+            for i in range(3000)
+        ]
+        # A second weigh-in on a day, a resent reading and one that's broken.
+        readings.append({"key": "evening", "measured_at": f"{today.isoformat()}T20:00:00+00:00", "weight": 91.0})
+        readings.append(readings[10])
+        readings.append({"key": "broken", "date": today.isoformat(), "weight": "heavy"})
+        body = json.dumps({"readings": readings})
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {key}"}
+
+        # SQLite caps bound parameters, which splits the bulk writes further than other databases do.
+        with self.assertQueryBudget(70, max_seconds=3):
+            response = self.client.post(reverse("api_readings"), body, content_type="application/json", **auth)
+        self.assertOk(response)
+        counts = response.json()["counts"]
+        self.assertEqual(counts, {"created": 3000 - self.DAYS, "updated": self.DAYS, "superseded": 1, "duplicate": 1, "rejected": 1})
+        self.assertEqual(WeightLog.objects.get(profile=self.profile, date=today).weight, 91.0)
+        self.assertEqual(ProfileStats.for_profile(self.profile).log_count, 3000)
+
+        # Resending the whole push is a no-op.
+        with self.assertQueryBudget(12, max_seconds=3):
+            response = self.client.post(reverse("api_readings"), body, content_type="application/json", **auth)
+        self.assertEqual(response.json()["counts"], {"duplicate": 3002, "rejected": 1})
+
+        response = self.client.post(reverse("api_readings"), body, content_type="application/json")
+        self.assertOk(response, 401)
+
+    def test_service_worker(self):
+        response = self.client.get(reverse("service_worker"))
+        self.assertOk(response)
+        self.assertEqual(response["Content-Type"], "application/javascript")
+        self.assertIn(reverse("sync_weight_logs"), response.content.decode())
+
+    def test_metrics(self):
+        SummaryJob.objects.create(
+            week_start=last_week()[0], week_end=last_week()[1], status=SummaryJob.DONE,
+            started_at=timezone.now() - timedelta(seconds=90), finished_at=timezone.now(),
+            failures=[{"user": "someone", "error": "ValueError: bad log"}],
+        )
+        for url in (reverse("dashboard"), reverse("analytics"), reverse("analytics"), reverse("export_logs")):
+            response = self.client.get(url)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        reset_database_health()
+
+        # Everything but the health check and the job tables is already in memory.
+        with self.settings(METRICS_TOKEN="scrape-me"), self.assertQueryBudget(3):
+            response = self.client.get(reverse("metrics"), headers={"Authorization": "Bearer scrape-me"})
+        self.assertOk(response)
+        body = response.content.decode()
+        self.assertRegex(body, r'tracc_request_duration_seconds_count\{view="analytics",method="GET",worker="\d+"\} [1-9]')
+        self.assertRegex(body, r'tracc_request_db_queries_bucket\{view="dashboard",worker="\d+",le="\+Inf"\} [1-9]')
+        self.assertRegex(body, r'tracc_cache_lookups_total\{cache="analytics",result="hit",worker="\d+"\} [1-9]')
+        self.assertRegex(body, r'tracc_log_rows_total\{operation="export",worker="\d+"\} [1-9]')
+        self.assertIn("tracc_database_up 1\n", body)
+        self.assertIn('tracc_summary_job_last_failures{status="done",week_start="', body)
+
+        # Health probes reuse the check.
+        with self.assertQueryBudget(0):
+            self.assertOk(self.client.get(reverse("health_json")))
+
+        with self.settings(METRICS_TOKEN="scrape-me"):
+            self.assertOk(self.client.get(reverse("metrics")), 401)
+            self.assertOk(self.client.get(reverse("metrics"), headers={"Authorization": "Bearer scrape-m"}), 401)
+        # Without a token they're only served while developing.
+        with self.settings(METRICS_TOKEN="", DEBUG=False):
+            self.assertOk(self.client.get(reverse("metrics")), 403)
+        with self.settings(METRICS_TOKEN="", DEBUG=True):
+            self.assertOk(self.client.get(reverse("metrics")))
+
+    def test_edit_weight_log(self):
+        log = WeightLog.objects.filter(profile=self.profile, check_in=True).order_by("date")[10]
+        with self.assertQueryBudget(21):
+            response = self.client.post(reverse("edit_weight_log", args=[log.pk]), {"weight": "90.1", "notes": "fixed"})
+        self.assertOk(response, 302)
+
+    def test_update_profile_height(self):
+        # Every log's BMI follows the new height in one UPDATE, however long the history.
+        with self.assertQueryBudget(16):
+            response = self.client.post(reverse("update_profile"), {
+                "gender": "M", "height_cm": "180", "target_weight": "70", "dob": "",
+            })
+        self.assertOk(response, 302)
+        log = WeightLog.objects.filter(profile=self.profile, weight__isnull=False).first()
+        self.assertEqual(log.bmi, round(log.weight / 1.8 ** 2, 2))
+
+    def test_complete_profile_twice(self):
+        # A resubmitted form (back button, double click) replaces the day's first log.
+        user, profile = self.create_profile("newcomer")
+        self.client.force_login(user)
+        for weight in ("84.2", "84.6"):
+            response = self.client.post(reverse("get_more_data"), {
+                "gender": "F", "height_cm": "165", "target_weight": "65", "current_weight": weight, "dob": "",
+            })
+            self.assertOk(response, 302)
+        log = WeightLog.objects.get(profile=profile)
+        self.assertEqual((log.date, log.weight, log.bmi), (timezone.localdate(), 84.6, bmi_for(84.6, 165)))
+        self.assertEqual(ProfileStats.objects.get(profile=profile).current_weight, 84.6)
+
+    def test_import_logs(self):
+        today = timezone.localdate()
+        rows = ["Date,Weight (kg),Notes/Mood"]
+        for i in range(1000):
+            # Every 10th day missing, the importer fills the gaps.
+            if i % 10:
+                rows.append(f"{(today - timedelta(days=i + 400)).strftime('%d/%m/%Y')},{85 - i * 0.01:.1f},imported")
+        upload = SimpleUploadedFile("logs.csv", "\n".join(rows).encode(), content_type="text/csv")
+
+        # Chunked upserts in one transaction, a malformed file writes nothing.
+        with self.assertQueryBudget(32, max_seconds=3):
+            response = self.client.post(reverse("import_logs"), {"csv_file": upload})
+        self.assertOk(response, 302)
+
+    def test_export_logs(self):
+        with self.assertQueryBudget(4):
+            response = self.client.get(reverse("export_logs"))
+            content = b"".join(response.streaming_content)
+        self.assertOk(response)
+        self.assertEqual(content.count(b"\n"), WeightLog.objects.filter(profile=self.profile).count() + 1)
+
+        for flag, content_type in (("1", "application/gzip"), ("true", "application/gzip"), ("0", "text/csv"), ("false", "text/csv")):
+            response = self.client.get(reverse("export_logs"), {"gzip": flag})
+            self.assertEqual(response["Content-Type"], content_type, flag)
+
+    def test_queries_do_not_grow_with_history(self):
+        # Same views for a profile with a tenth of the history must cost the same.
+        user, profile = self.create_profile("short-history")
+        self.seed_logs(profile, self.DAYS // 10)
+        urls = [reverse("dashboard"), reverse("analytics"), reverse("weightlog_list"), reverse("export_logs")]
+        urls += [reverse("analytics_chart", args=[chart]) for chart in ANALYTICS_CHARTS]
+        month_start = timezone.localdate().replace(day=1)
+        urls.append(f"{reverse('analytics_calendar')}?start={month_start}&end={month_start + timedelta(days=42)}")
+
+        counts = {}
+        for login in (self.user, user):
+            cache.clear()
+            self.client.force_login(login)
+            for url in urls:
+                with self.assertQueryBudget(10_000) as recorder:
+                    response = self.client.get(url)
+                    if response.streaming:
+                        b"".join(response.streaming_content)
+                counts.setdefault(url, []).append(len(recorder.queries))
+
+        for url, (long_history, short_history) in counts.items():
+            self.assertEqual(long_history, short_history, f"{url} queries depend on the number of logs")
+
+
+class BehaviourTests(QueryBudgetTestCase):
+    """Incremental and batched code paths against the full computation they replace."""
+
+    def streak_state(self, profile):
+        profile.refresh_from_db()
+        runs = list(StreakRun.objects.filter(profile=profile).values_list("start", "end", "length"))
+        return profile.streaks, profile.streaks_from, profile.last_check_in, runs
+
+    def test_update_all_bmis_matches_refresh_bmis(self):
+        # Heights a profile can be left with by hand, the zero one must not divide by zero.
+        for height in (172, 0, None):
+            _, profile = self.create_profile(f"bmis-{height}")
+            Profile.objects.filter(pk=profile.pk).update(height_cm=height)
+            self.seed_logs(profile, 30)
+        WeightLog.objects.update(bmi=1)
+        update_all_bmis()
+        batched = list(WeightLog.objects.order_by("pk").values_list("pk", "bmi"))
+        for profile in Profile.objects.all():
+            profile.refresh_bmis()
+        self.assertEqual(batched, list(WeightLog.objects.order_by("pk").values_list("pk", "bmi")))
+        self.assertFalse(WeightLog.objects.filter(profile__height_cm=0, bmi__isnull=False).exists())
+
+    def test_advance_streak_matches_rebuild(self):
+        _, profile = self.create_profile("streaks")
+        rng = random.Random(1)
+        day = timezone.localdate() - timedelta(days=300)
+        # Same day re-check-ins, next days, 2 day restores and broken streaks.
+        for _ in range(120):
+            day += timedelta(days=rng.choice([0, 1, 1, 1, 2, 2, 3, 6]))
+            check_in_at = timezone.make_aware(datetime.combine(day, dt_time(7, rng.randrange(60))))
+            log, created = WeightLog.objects.get_or_create(
+                profile=profile, date=day,
+                defaults={"weight": 80, "check_in": True, "check_in_at": check_in_at},
+            )
+            advance_streak(profile, log.check_in_at)
+
+            advanced = self.streak_state(profile)
+            update_streaks(Profile.objects.get(pk=profile.pk))
+            self.assertEqual(advanced, self.streak_state(profile), f"after checking in on {day}")
+        self.assertGreater(profile.streaks, 0)
+
+    def expected_milestones(self, profile):
+        """Titles the profile has earned, worked out from its logs one by one."""
+        logs = list(
+            profile.weightlog_set.exclude(weight__isnull=True).order_by("date").values_list("date", "weight", "bmi")
+        )
+        weights = [weight for _, weight, _ in logs]
+        min_bmi = min(bmi for *_, bmi in logs)
+        start_bmi = round(weights[0] / (profile.height_cm / 100) ** 2, 2)
+        target, losing = profile.target_weight, weights[0] >= profile.target_weight
+
+        longest = 0
+        since = None
+        for log_date, weight, _ in logs:
+            if (weight <= target + 1) if losing else (weight >= target - 1):
+                since = since or log_date
+                longest = max(longest, (log_date - since).days + 1)
+            else:
+                since = None
+
+        earned = {
+            "weight_loss": lambda value: weights[0] - min(weights) >= value,
+            "bmi": lambda value: min_bmi <= value,
+            "bmi_transition": lambda value: start_bmi >= value > min_bmi,
+            "streak": lambda value: profile.streaks >= value,
+            "log_count": lambda value: len(logs) >= value,
+            "target_weight": lambda value: min(weights) <= target if losing else max(weights) >= target,
+            "target_maintain": lambda value: longest >= value,
+        }
+        return {milestone.title for milestone in Milestone.objects.all() if earned[milestone.category](milestone.value)}
+
+    def test_achievements_match_the_logs(self):
+        # From obese to under target, then holding near it for six weeks.
+        _, profile = self.create_profile("achiever")
+        first_day = timezone.localdate() - timedelta(days=200)
+        weights = [100 - i * 0.2 for i in range(150)] + [69.5 + (i % 3) * 0.5 for i in range(50)]
+        WeightLog.objects.bulk_create([
+            WeightLog(
+                profile=profile, date=first_day + timedelta(days=i), weight=round(weight, 1),
+                bmi=round(weight / 1.72 ** 2, 2), check_in=i >= 180,
+                check_in_at=timezone.make_aware(datetime.combine(first_day + timedelta(days=i), dt_time(8))) if i >= 180 else None,
+            )
+            for i, weight in enumerate(weights)
+        ])
+        ProfileStats.rebuild(profile.pk)
+        update_streaks(profile)
+
+        for candidate in (profile, self.profile):
+            candidate.refresh_from_db()
+            check_for_achievements(candidate)
+            awarded = set(UserMilestone.objects.filter(profile=candidate).values_list("milestone__title", flat=True))
+            self.assertEqual(awarded, self.expected_milestones(candidate), candidate.user.username)
+
+        achieved = set(UserMilestone.objects.filter(profile=profile).values_list("milestone__title", flat=True))
+        self.assertLessEqual({"Obese Crusher", "Overweight Slayer", "Target Maintainer"}, achieved)
+
+    def test_achievements_skip_the_history_far_from_target(self):
+        # Never within reach of the target, the maintenance milestone can't be open.
+        _, profile = self.create_profile("far-off")
+        profile.target_weight = 60
+        profile.save()
+        first_day = timezone.localdate() - timedelta(days=90)
+        WeightLog.objects.bulk_create([
+            WeightLog(profile=profile, date=first_day + timedelta(days=i), weight=86 + i % 5, bmi=bmi_for(86 + i % 5, 172))
+            for i in range(90)
+        ])
+        ProfileStats.rebuild(profile.pk)
+
+        # Stats, catalog and achieved milestones, then the log count awards and their bump.
+        with self.assertQueryBudget(5) as recorder:
+            check_for_achievements(profile)
+        self.assertFalse([site for site, _ in recorder.queries if "_longest_target_maintain" in site])
+
+    def baseline_insights(self, profile, logs):
+        """The analytics numbers as the per-log loops before the numpy rewrite worked them out."""
+        import calendar
+
+        logs = list(logs)
+        changes, previous = [], None
+        for log in logs:
+            if log.weight is None:
+                break
+            if previous is not None:
+                changes.append({"date": log.date.strftime("%d-%m-%Y"), "change": round(log.weight - previous, 1)})
+            previous = log.weight
+
+        months = defaultdict(list)
+        for log in logs:
+            if log.weight:
+                months[log.date.strftime("%Y-%m")].append((log.weight, log.bmi))
+        monthly_avg = []
+        for month, values in months.items():
+            bmis = [bmi for _, bmi in values if bmi is not None]
+            year, month = month.split("-")
+            monthly_avg.append({
+                "month": f"{calendar.month_abbr[int(month)]} {year}",
+                "avg_weight": round(sum(weight for weight, _ in values) / len(values), 1),
+                "avg_bmi": round(sum(bmis) / len(bmis), 1) if bmis else None,
+            })
+
+        zones = dict.fromkeys(["Underweight", "Normal", "Overweight", "Obese"], 0)
+        for log in logs:
+            if log.bmi is not None:
+                zone = "Underweight" if log.bmi < 18.5 else "Normal" if log.bmi < 25 else "Overweight" if log.bmi < 30 else "Obese"
+                zones[zone] += 1
+
+        fastest, previous = None, None
+        for log in logs:
+            if log.weight is None:
+                continue
+            if previous is not None:
+                drop = round(log.weight - previous, 1)
+                if drop < 0 and (fastest is None or drop < fastest["drop"]):
+                    fastest = {"date": log.date.strftime("%d-%m-%Y"), "drop": drop}
+            previous = log.weight
+
+        weighed = [log for log in logs if log.weight is not None]
+        progress = None
+        if profile.target_weight and weighed:
+            start, latest = weighed[0].weight, weighed[-1].weight
+            if start != profile.target_weight:
+                progress = max(0, min(round((start - latest) / (start - profile.target_weight) * 100), 100))
+
+        return {
+            "line": pandas_daily_series([(log.date, log.weight) for log in logs]),
+            "daily-changes": changes,
+            "monthly-avg": monthly_avg,
+            "weight-zones": [{"label": zone, "count": count, "color": f"--bmi-{zone.lower()}"} for zone, count in zones.items()],
+            "fastest-drop": fastest,
+            "progress": progress,
+        }
+
+    def test_insights_match_the_baseline(self):
+        # Gaps, a day without a weight, logs without a BMI and several months of ups and downs.
+        _, profile = self.create_profile("insights")
+        rng = random.Random(8)
+        first_day = timezone.localdate() - timedelta(days=150)
+        logs = []
+        for i in sorted(rng.sample(range(150), 110)):
+            weight = round(rng.uniform(60, 100), 1)
+            logs.append(WeightLog(
+                profile=profile, date=first_day + timedelta(days=i), weight=None if i == 120 else weight,
+                bmi=None if i % 17 == 0 or i == 120 else bmi_for(weight, 172),
+            ))
+        WeightLog.objects.bulk_create(logs)
+        ProfileStats.rebuild(profile.pk)
+
+        for candidate in (profile, self.profile):
+            for logs in (analytics_logs(candidate), candidate.weightlog_set.order_by("date")):
+                expected = self.baseline_insights(candidate, logs)
+                for db_aggregates in (False, True):
+                    insights = Insights(logs, db_aggregates=db_aggregates)
+                    self.assertEqual({
+                        "line": insights.get_line_data(),
+                        "daily-changes": insights.get_daily_change(),
+                        "monthly-avg": insights.get_monthly_avg(),
+                        "weight-zones": insights.get_weight_zones(),
+                        "fastest-drop": insights.get_fastest_drop(),
+                        "progress": insights.get_progress(candidate)[0],
+                    }, expected, f"{candidate.user.username}, db_aggregates={db_aggregates}")
+
+    def test_profile_stats_follow_log_writes(self):
+        _, profile = self.create_profile("stats")
+        fields = [
+            "start_weight", "current_weight", "min_weight", "max_weight", "current_bmi", "min_bmi",
+            "log_count", "first_log_date", "last_log_date",
+        ]
+        rng = random.Random(13)
+        first_day = timezone.localdate() - timedelta(days=40)
+        for step in range(150):
+            logs = list(WeightLog.objects.filter(profile=profile))
+            action = rng.choice(["add", "add", "edit", "edit", "move", "clear", "delete", "delete_many"] if logs else ["add"])
+            weight = round(rng.uniform(60, 90), 1)
+            if action == "add":
+                day = first_day + timedelta(days=rng.randrange(40))
+                WeightLog.objects.update_or_create(profile=profile, date=day, defaults={"weight": weight})
+            elif action in ("edit", "move", "clear"):
+                log = rng.choice(logs)
+                if action == "move":
+                    log.date = first_day + timedelta(days=rng.randrange(40))
+                    if WeightLog.objects.filter(profile=profile, date=log.date).exclude(pk=log.pk).exists():
+                        continue
+                log.weight = None if action == "clear" else weight
+                log.save()
+            elif action == "delete":
+                rng.choice(logs).delete()
+            else:
+                since = first_day + timedelta(days=rng.randrange(40))
+                profile.weightlog_set.filter(date__gte=since, date__lt=since + timedelta(days=5)).delete()
+
+            stats = ProfileStats.objects.get(profile=profile)
+            incremental = {field: getattr(stats, field) for field in fields}
+            rebuilt = ProfileStats.rebuild(profile.pk)
+            self.assertEqual(incremental, {field: getattr(rebuilt, field) for field in fields}, f"step {step}, {action}")
+
+    def test_cached_none_is_a_hit(self):
+        # e.g. the fastest drop chart of a profile that never lost weight.
+        calls = []
+        for _ in range(3):
+            self.assertIsNone(cached_for_profile(self.profile, "chart:nothing", lambda: calls.append(1)))
+        self.assertEqual(len(calls), 1)
+
+    def test_log_pages_walk_the_full_list(self):
+        expected = list(WeightLog.objects.filter(profile=self.profile).order_by("-date", "-id").values_list("id", flat=True))
+        seen, cursor = [], None
+        while True:
+            page, cursor = get_logs_page(self.profile, cursor)
+            seen += [log["id"] for log in page]
+            if cursor is None:
+                break
+            # Logs written while scrolling don't shift the pages after the cursor.
+            WeightLog.objects.filter(profile=self.profile, date=timezone.localdate()).delete()
+            WeightLog.objects.create(profile=self.profile, date=timezone.localdate(), weight=80)
+        self.assertEqual(seen, expected)
+
+        for cursor in ("nope", "2025-01-01", "2025-01-01_x", "2025-13-01_4"):
+            self.assertOk(self.client.get(reverse("weightlog_page"), {"cursor": cursor}), 400)
+
+    def test_import_upserts_match_the_file(self):
+        first_day = timezone.localdate() - timedelta(days=100)
+        lines = ["Date,Weight (kg),Notes/Mood"]
+        expected = {}
+        rng = random.Random(4)
+        for i in rng.sample(range(60), 45) + [3, 3, 10]:
+            day = first_day + timedelta(days=i)
+            weight, notes = round(rng.uniform(70, 80), 1), f"row {len(lines)}"
+            lines.append(f"{day.strftime('%d/%m/%Y')},{weight},{notes}")
+            expected[day] = (weight, notes)
+        lines += ["not a date,70,bad", f"{first_day.strftime('%d/%m/%Y')},heavy,bad"]
+
+        results = []
+        for chunk_size in (3, 1000):
+            _, profile = self.create_profile(f"importer-{chunk_size}")
+            # One day the file overwrites, one it leaves to the gap filler (which must not touch it).
+            WeightLog.objects.create(profile=profile, date=first_day + timedelta(days=3), weight=90, notes="old")
+            kept = WeightLog.objects.create(profile=profile, date=first_day - timedelta(days=1), weight=91, notes="kept")
+
+            self.assertEqual(import_weight_logs(profile, iter(lines), chunk_size=chunk_size), len(lines) - 3)
+            logs = {log.date: log for log in WeightLog.objects.filter(profile=profile)}
+            self.assertEqual({day: (logs[day].weight, logs[day].notes) for day in expected}, expected)
+            self.assertTrue(all(logs[day].bmi == bmi_for(logs[day].weight, 172) for day in logs))
+            self.assertEqual((logs[kept.date].weight, logs[kept.date].notes), (91, "kept"))
+            results.append(sorted(logs))
+
+        # Gap logs fill the same days however the rows were chunked.
+        self.assertEqual(results[0], results[1])
+
+    def test_import_rejects_a_malformed_file(self):
+        day = timezone.localdate().strftime("%d/%m/%Y")
+        lines = ["Date,Weight (kg),Notes/Mood", f"{day},80,fine", f"{day},81,{'x' * 200_000}"]
+        before = WeightLog.objects.count()
+        with self.assertRaises(ImportFileError):
+            import_weight_logs(self.profile, iter(lines), chunk_size=1)
+        self.assertEqual(WeightLog.objects.count(), before)
+
+        upload = SimpleUploadedFile("logs.csv", "\n".join(lines).encode(), content_type="text/csv")
+        response = self.client.post(reverse("import_logs"), {"csv_file": upload}, follow=True)
+        self.assertIn("nothing was imported", response.content.decode())
+
+
+class CommandQueryBudgetTests(QueryBudgetTestCase):
+    PROFILES = 40
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for i in range(cls.PROFILES - 1):
+            _, profile = cls.create_profile(f"budget-{i}")
+            cls.seed_logs(profile, 30)
+
+    def call(self, *args, **kwargs):
+        call_command(*args, stdout=StringIO(), stderr=StringIO(), **kwargs)
+
+    def test_generate_weekly_summaries(self):
+        with self.assertQueryBudget(12):
+            self.call("generate_weekly_summaries", batch_size=20)
+        self.assertEqual(WeeklySummary.objects.count(), self.PROFILES)
+
+    def expected_summaries(self, start_date, end_date):
+        """Weekly summaries worked out one profile at a time, by user id."""
+        command = GenerateWeeklySummaries()
+        expected = {}
+        for profile in Profile.objects.order_by("id"):
+            logs = list(
+                WeightLog.objects.filter(profile=profile, date__range=(start_date, end_date))
+                .order_by("date").values_list("date", "weight", "bmi")
+            )
+            weights = [weight for _, weight, _ in logs if weight]
+            if not weights:
+                continue
+            avg_weight = sum(weights) / len(weights)
+            prev_weights = [
+                weight for weight in WeightLog.objects.filter(
+                    profile=profile, date__range=(start_date - timedelta(days=7), end_date - timedelta(days=7)),
+                ).order_by("date").values_list("weight", flat=True) if weight
+            ]
+            prev_avg = sum(prev_weights) / len(prev_weights) if prev_weights else avg_weight
+            highlights, streak = command.generate_highlights(logs)
+            expected[profile.user_id] = (
+                avg_weight, round(avg_weight - prev_avg, 2), command.bmi_status(logs[-1][2]), highlights, streak,
+            )
+        return expected
+
+    def stored_summaries(self, start_date):
+        return {
+            summary.user_id: (
+                summary.avg_weight, summary.change_from_last_week, summary.bmi_status, summary.highlights, summary.streak,
+            )
+            for summary in WeeklySummary.objects.filter(week_start=start_date)
+        }
+
+    def test_batched_summaries_match_per_profile(self):
+        # A profile without logs that week is skipped, one with only weightless logs too.
+        week_start, week_end = last_week()
+        self.create_profile("no-logs")
+        _, weightless = self.create_profile("weightless")
+        WeightLog.objects.create(profile=weightless, date=week_start, weight=None)
+        WeeklySummary.objects.all().delete()
+
+        expected = self.expected_summaries(week_start, week_end)
+        self.assertEqual(len(expected), self.PROFILES)
+        self.call("generate_weekly_summaries", batch_size=7)
+        self.assertEqual(self.stored_summaries(week_start), expected)
+
+    def test_sharded_summaries_match_per_profile(self):
+        # Shards run one by one here (pool workers can't see the test transaction), together they cover every profile once.
+        week_start, week_end = last_week()
+        WeeklySummary.objects.all().delete()
+        expected = self.expected_summaries(week_start, week_end)
+
+        max_id = Profile.objects.order_by("-id").values_list("id", flat=True).first()
+        for shard in range(1, 4):
+            self.call("generate_weekly_summaries", shard=f"{shard}/3", max_id=max_id, batch_size=5)
+        self.assertEqual(self.stored_summaries(week_start), expected)
+
+        # A retried shard rewrites its own summaries and nothing else.
+        WeeklySummary.objects.update(has_checked=True)
+        self.call("generate_weekly_summaries", shard="2/3", max_id=max_id)
+        low, high = shard_id_range(2, 3, max_id)
+        in_shard = Profile.objects.filter(id__gt=low, id__lte=high, user_id__in=expected).values_list("user_id", flat=True)
+        rewritten = WeeklySummary.objects.filter(has_checked=False).values_list("user_id", flat=True)
+        self.assertEqual(set(rewritten), set(in_shard))
+        self.assertEqual(self.stored_summaries(week_start), expected)
+
+    def test_run_summary_jobs(self):
+        week_start, week_end = last_week()
+        job = SummaryJob.objects.create(week_start=week_start, week_end=week_end)
+        with self.assertQueryBudget(20):
+            self.call("run_summary_jobs", once=True, batch_size=20)
+        job.refresh_from_db()
+        self.assertEqual(job.status, SummaryJob.DONE)
+
+    def test_crashed_summary_job_is_failed(self):
+        # Claimed an hour ago by a worker that died before its first batch.
+        week_start, week_end = last_week()
+        crashed_at = timezone.now() - timedelta(hours=1)
+        crashed = SummaryJob.objects.create(
+            week_start=week_start, week_end=week_end, status=SummaryJob.RUNNING,
+            started_at=crashed_at, heartbeat_at=crashed_at,
+        )
+        busy = SummaryJob.objects.create(
+            week_start=week_start - timedelta(days=7), week_end=week_end - timedelta(days=7),
+            status=SummaryJob.RUNNING, started_at=crashed_at, heartbeat_at=timezone.now(),
+        )
+
+        with self.assertQueryBudget(6):
+            response = self.client.get(reverse("run_weekly_summary"), {"token": settings.CRON_SECRET})
+        self.assertOk(response, 202)
+        crashed.refresh_from_db()
+        self.assertEqual(crashed.status, SummaryJob.FAILED)
+        self.assertIn("heartbeat", crashed.error)
+
+        # The new job runs, the one still beating is left to its worker.
+        self.call("run_summary_jobs", once=True, batch_size=20)
+        self.assertEqual(SummaryJob.objects.get(pk=response.json()["job_id"]).status, SummaryJob.DONE)
+        busy.refresh_from_db()
+        self.assertEqual(busy.status, SummaryJob.RUNNING)
+
+    def test_seed_milestones(self):
+        # Runs the achievement checks once per profile.
+        with self.assertQueryBudget(6 * self.PROFILES + 20, max_seconds=3):
+            self.call("seed_milestones")
+
+    def test_sync_milestone_catalog(self):
+        # Stale copies of the catalog are written back together, every page moves on once.
+        stale = list(Milestone.objects.order_by("pk")[:5])
+        Milestone.objects.filter(pk__in=[milestone.pk for milestone in stale]).update(description="Old copy.")
+        versions = dict(Profile.objects.values_list("pk", "data_version"))
+        with self.assertQueryBudget(4):
+            results = sync_milestone_catalog()
+        updated = sorted(milestone.pk for milestone, status in results if status == "updated")
+        self.assertEqual(updated, [milestone.pk for milestone in stale])
+        self.assertFalse(Milestone.objects.filter(description="Old copy.").exists())
+        self.assertEqual(
+            dict(Profile.objects.values_list("pk", "data_version")),
+            {pk: version + 1 for pk, version in versions.items()},
+        )
+
+    def test_update_bmi(self):
+        with self.assertQueryBudget(6):
+            self.call("update_bmi")
+
+    def test_rebuild_profile_stats(self):
+        # Rebuilds are a few queries per profile.
+        with self.assertQueryBudget(7 * self.PROFILES + 2, max_seconds=3):
+            self.call("rebuild_profile_stats")
+
+    def test_bench_weightlog_indexes(self):
+        with self.assertQueryBudget(40, max_seconds=5):
+            self.call("bench_weightlog_indexes", profiles=5, days=20, runs=2, force=True)
+
+    def test_update_streaks(self):
+        # Reads every profile's check-ins in one query, writes a few rows per profile.
+        with self.assertQueryBudget(5 * self.PROFILES + 5):
+            self.call("update_streaks")
+
+    def test_sync(self):
+        # seed_milestones, update_bmi and update_streaks back to back.
+        with self.assertQueryBudget(10 * self.PROFILES + 30, max_seconds=3):
+            self.call("sync")
+
+    def test_create_api_token(self):
+        with self.assertQueryBudget(2):
+            self.call("create_api_token", self.user.username, name="Scale")
+        self.assertEqual(ApiToken.objects.filter(user=self.user).count(), 1)
+
+        with self.assertRaises(CommandError):
+            self.call("create_api_token", "nobody")
+
+    def test_run_benchmarks(self):
+        self.call("seed_synthetic_data", users=2, years=0.2, seed=1)
+        # Two runs of every benchmark, the jobs among them cost a few queries per profile.
+        budget = 2 * 13 * Profile.objects.count() + 100
+        with tempfile.TemporaryDirectory() as directory, self.assertQueryBudget(budget, max_seconds=10):
+            self.call(
+                "run_benchmarks", sample=2, repeat=2, import_rows=50, output=f"{directory}/results.json", force=True,
+            )
+
+    def test_bench_line_data(self):
+        # In memory only.
+        with self.assertQueryBudget(0, max_seconds=5):
+            self.call("bench_line_data", days=120, runs=5)
+
+    def test_bench_startup(self):
+        # The workers it boots are separate processes, none of their queries run here.
+        with self.assertQueryBudget(0, max_seconds=30):
+            self.call("bench_startup", runs=1)
+
+    def test_bench_db_pool(self):
+        # Needs PostgreSQL and gunicorn, on the test database it only refuses to run.
+        if connection.vendor == "postgresql":
+            self.skipTest("Load tests a live gunicorn, not something to run in the test suite.")
+        with self.assertQueryBudget(0), self.assertRaises(CommandError):
+            self.call("bench_db_pool")
 
-# Create your tests here.
+    def test_seed_synthetic_data(self):
+        # Logs go in with bulk inserts, the rest is a few queries per user.
+        with self.assertQueryBudget(20 * 10 + 30, max_seconds=3):
+            self.call("seed_synthetic_data", users=10, years=1, seed=1)
+        self.assertEqual(Profile.objects.filter(user__username__startswith="synthetic-").count(), 10)
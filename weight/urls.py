@@ -19,10 +19,12 @@ urlpatterns = [
 
     # Logs
     path('logs/', views.weightlog_list, name='weightlog_list'),
+    path('logs/page/', views.weightlog_page, name='weightlog_page'),
     path('logs/add/', views.add_or_edit_weight_log, name='add_weight_log'),
     path('logs/<int:pk>/edit/', views.add_or_edit_weight_log, name='edit_weight_log'),
     path('logs/<int:pk>/delete/', views.delete_weight_log, name='delete_weight_log'),
     path('clock_in/', views.add_or_edit_weight_log, name='clock_in'),
+    path('logs/sync/', views.sync_weight_logs, name='sync_weight_logs'),
 
     # Settings
     path('settings/', views.settings_views, name='settings'),
@@ -31,13 +33,24 @@ urlpatterns = [
 
     # Analytics
     path('analytics/', views.analytics, name='analytics'),
+    path('analytics/charts/<slug:chart>/', views.analytics_chart, name='analytics_chart'),
+    path('analytics/calendar/', views.analytics_calendar, name='analytics_calendar'),
+
+    # Offline.
+    path('service-worker.js', views.service_worker, name='service_worker'),
+    path('offline/', views.offline_view, name='offline'),
+
+    # Ingest API.
+    path('api/readings/', views.api_readings, name='api_readings'),
 
     # Health.
     path("health/", views.health_view, name="health_page"),
     path("healthz/", views.health_json, name="health_json"),\
+    path("metrics/", views.metrics_view, name="metrics"),
     
     # Weekly summary.
     path("run-weekly-summary/", views.run_weekly_summary, name="run_weekly_summary"),
+    path("run-weekly-summary/<int:pk>/", views.weekly_summary_job, name="weekly_summary_job"),
 
     # Catch-all empty path redirect
     path('', lambda request: redirect('dashboard'), name='home_redirect'),
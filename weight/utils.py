@@ -1,162 +1,372 @@
-from .models import Milestone, UserMilestone, Profile, WeightLog
-from datetime import timedelta
-import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Case, Count, F, OuterRef, Q, Subquery, When
+from django.db.models.functions import NullIf, Round, TruncMonth
+from django.utils import timezone
 
+from .metrics import record_cache_lookup, record_log_rows
+from .models import IngestedReading, Milestone, UserMilestone, Profile, ProfileStats, StreakRun, WeightLog, bmi_for
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta
+import csv
+import logging
+import random
+import time
 
-def _assign_milestone(profile, milestone_title):
-    milestone = Milestone.objects.get(title=milestone_title)
-    obj, created = UserMilestone.objects.get_or_create(profile=profile, milestone=milestone)
-    if created:
-        print(f"🏅 {profile.user.username} achieved: {milestone.title}")
+logger = logging.getLogger(__name__)
 
+# numpy and dateutil are imported where they're used: most requests never
+# need them and every worker would pay for them at boot (see bench_startup).
 
-def check_for_achievements(profile):
-    logs = profile.weightlog_set.exclude(weight__isnull=True).order_by("date")
-    streaks = profile.streaks
-    
-    # Streak milestones
-    for milestone in Milestone.objects.filter(category="streak"):
-        if streaks == milestone.value:
-            _assign_milestone(profile, milestone.title)
 
-    for log in logs:
-        current_weight = log.weight
-        current_bmi = log.bmi
+# Seconds a profile's cached results live, they're replaced sooner on any write.
+PROFILE_CACHE_TIMEOUT = 60 * 60 * 24
 
-        # Weight loss milestones
-        starting_weight = logs.first().weight
-        weight_lost = starting_weight - current_weight
-        for milestone in Milestone.objects.filter(category="weight_loss"):
-            if weight_lost >= milestone.value:
-                _assign_milestone(profile, milestone.title)
 
-        # BMI milestones
-        for milestone in Milestone.objects.filter(category="bmi_target"):
-            if current_bmi <= milestone.value:
-                _assign_milestone(profile, milestone.title)
+# Bumps asked for inside `batched_data_versions()`, as (profile ids, user ids).
+_pending_bumps = ContextVar("pending_bumps", default=None)
+
+
+def bump_data_version(*profile_ids, user_id=None):
+    """Invalidates everything cached for the profiles by moving them to a new version."""
+    pending = _pending_bumps.get()
+    if pending is not None:
+        pending[0].update(profile_ids)
+        if not profile_ids:
+            pending[1].add(user_id)
+        return
+    profiles = Profile.objects.filter(pk__in=profile_ids) if profile_ids else Profile.objects.filter(user_id=user_id)
+    profiles.update(data_version=F("data_version") + 1, data_changed_at=timezone.now())
+
+
+@contextmanager
+def batched_data_versions():
+    """Collects the bumps a request makes through several writes and their signals into one UPDATE."""
+    if _pending_bumps.get() is not None:
+        yield
+        return
+    pending = (set(), set())
+    token = _pending_bumps.set(pending)
+    try:
+        yield
+    finally:
+        # Also after a failure, whatever was written before it must not be served stale.
+        _pending_bumps.reset(token)
+        profile_ids, user_ids = pending
+        if profile_ids or user_ids:
+            Profile.objects.filter(Q(pk__in=profile_ids) | Q(user_id__in=user_ids)).update(
+                data_version=F("data_version") + 1, data_changed_at=timezone.now(),
+            )
+
+
+def bump_all_data_versions():
+    """Same for every profile, when something all pages show changes (BMIs, the milestone catalog)."""
+    Profile.objects.update(data_version=F("data_version") + 1, data_changed_at=timezone.now())
+
+
+def profile_cache_key(profile, name):
+    return f"profile:{profile.pk}:v{profile.data_version}:{name}"
+
+
+# Told apart from a cached None.
+_MISSING = object()
+
+
+def cached_for_profile(profile, name, compute, timeout=PROFILE_CACHE_TIMEOUT):
+    """Returns `compute()` cached under the profile's current data version."""
+    key = profile_cache_key(profile, name)
+    value = cache.get(key, _MISSING)
+    # Named by kind, "chart:line" counts as "chart".
+    record_cache_lookup(name.split(":")[0], value is not _MISSING)
+    if value is _MISSING:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+# Kg of slack allowed above (or below) the target while maintaining it.
+TARGET_MAINTAIN_TOLERANCE = 1.0
+
+# Seconds before a worker re-reads the milestone catalog on its own.
+MILESTONE_CATALOG_TTL = 300
+
+_milestone_catalog = None
+_milestone_catalog_loaded_at = 0
+
+
+def get_milestone_catalog():
+    """Returns milestones grouped by category, cached in-process."""
+    global _milestone_catalog, _milestone_catalog_loaded_at
+
+    now = time.monotonic()
+    stale = _milestone_catalog is None or now - _milestone_catalog_loaded_at > MILESTONE_CATALOG_TTL
+    record_cache_lookup("milestone_catalog", not stale)
+    if stale:
+        catalog = defaultdict(list)
+        for milestone in Milestone.objects.all():
+            catalog[milestone.category].append(milestone)
+        _milestone_catalog = dict(catalog)
+        _milestone_catalog_loaded_at = now
 
-        # TODO: Add other milestone types here.
+    return _milestone_catalog
 
 
-def seed_milestones():
-    MILESTONES = [
-        # 📉 Weight Loss
-        {
-            "title": "First Step",
-            "description": "Logged your first weight entry 🎉",
-            "category": "weight_loss",
-            "value": 0,
-        },
-        {
-            "title": "First 2 Kg Down",
-            "description": "Lost your first 2 kilograms 🎉",
-            "category": "weight_loss",
-            "value": 2,
-        },
-        {
-            "title": "5Kg Down",
-            "description": "Lost 5 kilograms 🏆",
-            "category": "weight_loss",
-            "value": 5,
-        },
-        {
-            "title": "10Kg Warrior",
-            "description": "Lost 10 kilograms 🔥",
-            "category": "weight_loss",
-            "value": 10,
-        },
-        {
-            "title": "20Kg Beast Mode",
-            "description": "Lost 20 kilograms 💪",
-            "category": "weight_loss",
-            "value": 20,
-        },
-
-        # ⚖️ BMI Based
-        {
-            "title": "Normal BMI Ninja",
-            "description": "Entered the normal BMI range (18.5-24.9) ✨",
-            "category": "bmi",
-            "value": 24.9,
-        },
-        {
-            "title": "Obese Crusher",
-            "description": "Moved from Obese to Overweight category 👏",
-            "category": "bmi",
-            "value": 0,
-        },
-        {
-            "title": "Overweight Slayer",
-            "description": "Moved from Overweight to Normal BMI category 🥳",
-            "category": "bmi",
-            "value": 0,
-        },
-
-        # 🎯 Target
-        {
-            "title": "Bullseye!",
-            "description": "Reached your target weight 🎯",
-            "category": "target_weight",
-            "value": 1,
-        },
-        {
-            "title": "Target Maintainer",
-            "description": "Maintained your target weight for 30 days ✅",
-            "category": "target_weight",
-            "value": 30,
-        },
-
-        # 🔥 Streaks
-        {
-            "title": "7-Day Hustler",
-            "description": "Logged weight for 7 days in a row 🔥",
-            "category": "streak",
-            "value": 7,
-        },
-        {
-            "title": "30-Day Champ",
-            "description": "Logged weight for 30 days in a row 🐉",
-            "category": "streak",
-            "value": 30,
-        },
-        {
-            "title": "100-Day Legend",
-            "description": "Logged weight for 100 days in a row 💯",
-            "category": "streak",
-            "value": 100,
-        },
-
-        # 📊 Consistency
-        {
-            "title": "Deca Logger",
-            "description": "Logged your weight 10 times 📊",
-            "category": "log_count",
-            "value": 10,
-        },
-        {
-            "title": "50 Logs Hero",
-            "description": "Logged your weight 50 times 📈",
-            "category": "log_count",
-            "value": 50,
-        },
-        {
-            "title": "Consistency King/Queen",
-            "description": "Logged your weight 100 times 🏅",
-            "category": "log_count",
-            "value": 100,
-        },
-    ]
-
-    # Seed milestones
-    for milestone_data in MILESTONES:
-        milestone, created = Milestone.objects.get_or_create(
-            title=milestone_data["title"],
-            defaults=milestone_data,
-        )
-        if created:
-            print(f"🌱 Created milestone: {milestone.title}")
+def invalidate_milestone_catalog():
+    global _milestone_catalog
+    _milestone_catalog = None
+
+
+def _longest_target_maintain(profile, losing):
+    """Longest run of days the logs stayed within tolerance of the target."""
+    target = profile.target_weight
+    logs = (
+        profile.weightlog_set.exclude(weight__isnull=True)
+        .order_by("date")
+        .values_list("date", "weight")
+    )
+
+    maintain_from = None
+    longest_maintain = 0
+    for log_date, weight in logs:
+        if losing:
+            near_target = weight <= target + TARGET_MAINTAIN_TOLERANCE
+        else:
+            near_target = weight >= target - TARGET_MAINTAIN_TOLERANCE
+
+        if near_target:
+            maintain_from = maintain_from or log_date
+            longest_maintain = max(longest_maintain, (log_date - maintain_from).days + 1)
         else:
-            print(f"⚠️ Already exists: {milestone.title}")
+            maintain_from = None
+
+    return longest_maintain
+
+
+def check_for_achievements(profile):
+    # Everything but target maintenance comes straight from the stats row.
+    stats = ProfileStats.for_profile(profile)
+    if not stats.log_count:
+        return []
+
+    target = profile.target_weight
+    losing = target is not None and stats.start_weight >= target
+    start_bmi = bmi_for(stats.start_weight, profile.height_cm)
+    if target is None:
+        reached_target = False
+    elif losing:
+        reached_target = stats.min_weight <= target
+    else:
+        reached_target = stats.max_weight >= target
+
+    # Only walk the logs if a maintenance milestone is still open and the stats
+    # say one could be earned: a log came near the target, over a long enough history.
+    if target is None:
+        near_target = False
+    elif losing:
+        near_target = stats.min_weight <= target + TARGET_MAINTAIN_TOLERANCE
+    else:
+        near_target = stats.max_weight >= target - TARGET_MAINTAIN_TOLERANCE
+    logged_days = (stats.last_log_date - stats.first_log_date).days + 1
+    longest_maintain = []
+
+    def maintained(value):
+        if not near_target or logged_days < value:
+            return False
+        if not longest_maintain:
+            longest_maintain.append(_longest_target_maintain(profile, losing))
+        return longest_maintain[0] >= value
+
+    checks = {
+        "weight_loss": lambda value: stats.start_weight - stats.min_weight >= value,
+        "bmi": lambda value: stats.min_bmi is not None and stats.min_bmi <= value,
+        "streak": lambda value: profile.streaks >= value,
+        "log_count": lambda value: stats.log_count >= value,
+        "target_weight": lambda value: reached_target,
+        "target_maintain": maintained,
+        "bmi_transition": lambda value: (
+            start_bmi is not None and stats.min_bmi is not None and start_bmi >= value > stats.min_bmi
+        ),
+    }
+
+    achieved = set(
+        UserMilestone.objects.filter(profile=profile).values_list("milestone_id", flat=True)
+    )
+    earned = []
+    for category, milestones in get_milestone_catalog().items():
+        check = checks.get(category)
+        if not check:
+            continue
+        for milestone in milestones:
+            if milestone.pk not in achieved and check(milestone.value):
+                earned.append(milestone)
+
+    if earned:
+        UserMilestone.objects.bulk_create(
+            [UserMilestone(profile=profile, milestone=milestone) for milestone in earned],
+            ignore_conflicts=True,
+        )
+        bump_data_version(profile.pk)
+    for milestone in earned:
+        logger.info("Profile %s achieved: %s", profile.pk, milestone.title)
+
+    return earned
+
+
+# The milestone catalog, matched to the stored rows by title. bmi_transition
+# values are the BMI a profile started at or above and has since dropped below.
+MILESTONES = [
+    # 📉 Weight Loss
+    {
+        "title": "First Step",
+        "description": "Logged your first weight entry 🎉",
+        "category": "weight_loss",
+        "value": 0,
+    },
+    {
+        "title": "First 2 Kg Down",
+        "description": "Lost your first 2 kilograms 🎉",
+        "category": "weight_loss",
+        "value": 2,
+    },
+    {
+        "title": "5Kg Down",
+        "description": "Lost 5 kilograms 🏆",
+        "category": "weight_loss",
+        "value": 5,
+    },
+    {
+        "title": "10Kg Warrior",
+        "description": "Lost 10 kilograms 🔥",
+        "category": "weight_loss",
+        "value": 10,
+    },
+    {
+        "title": "20Kg Beast Mode",
+        "description": "Lost 20 kilograms 💪",
+        "category": "weight_loss",
+        "value": 20,
+    },
+
+    # ⚖️ BMI Based
+    {
+        "title": "Normal BMI Ninja",
+        "description": "Entered the normal BMI range (18.5-24.9) ✨",
+        "category": "bmi",
+        "value": 24.9,
+    },
+    {
+        "title": "Obese Crusher",
+        "description": "Moved from Obese to Overweight category 👏",
+        "category": "bmi_transition",
+        "value": 30,
+    },
+    {
+        "title": "Overweight Slayer",
+        "description": "Moved from Overweight to Normal BMI category 🥳",
+        "category": "bmi_transition",
+        "value": 25,
+    },
+
+    # 🎯 Target
+    {
+        "title": "Bullseye!",
+        "description": "Reached your target weight 🎯",
+        "category": "target_weight",
+        "value": 1,
+    },
+    {
+        "title": "Target Maintainer",
+        "description": "Maintained your target weight for 30 days ✅",
+        "category": "target_maintain",
+        "value": 30,
+    },
+
+    # 🔥 Streaks
+    {
+        "title": "7-Day Hustler",
+        "description": "Logged weight for 7 days in a row 🔥",
+        "category": "streak",
+        "value": 7,
+    },
+    {
+        "title": "30-Day Champ",
+        "description": "Logged weight for 30 days in a row 🐉",
+        "category": "streak",
+        "value": 30,
+    },
+    {
+        "title": "100-Day Legend",
+        "description": "Logged weight for 100 days in a row 💯",
+        "category": "streak",
+        "value": 100,
+    },
+
+    # 📊 Consistency
+    {
+        "title": "Deca Logger",
+        "description": "Logged your weight 10 times 📊",
+        "category": "log_count",
+        "value": 10,
+    },
+    {
+        "title": "50 Logs Hero",
+        "description": "Logged your weight 50 times 📈",
+        "category": "log_count",
+        "value": 50,
+    },
+    {
+        "title": "Consistency King/Queen",
+        "description": "Logged your weight 100 times 🏅",
+        "category": "log_count",
+        "value": 100,
+    },
+]
+
+
+def sync_milestone_catalog():
+    """
+    Creates missing MILESTONES and rewrites stored ones whose category, value
+    or description changed. Returns (milestone, "created" | "updated" | "unchanged") pairs.
+    """
+    stored = {milestone.title: milestone for milestone in Milestone.objects.filter(
+        title__in=[data["title"] for data in MILESTONES]
+    )}
+    results, created, updated, fields = [], [], [], set()
+    for data in MILESTONES:
+        milestone = stored.get(data["title"])
+        if milestone is None:
+            milestone = Milestone(**data)
+            created.append(milestone)
+            results.append((milestone, "created"))
+            continue
+        changed = [
+            field for field, value in data.items()
+            if getattr(milestone, field) != Milestone._meta.get_field(field).to_python(value)
+        ]
+        for field in changed:
+            setattr(milestone, field, data[field])
+        if changed:
+            updated.append(milestone)
+            fields.update(changed)
+        results.append((milestone, "updated" if changed else "unchanged"))
+
+    # The bulk writes skip the signals that refresh the catalog and the pages showing it, done once here.
+    if created:
+        Milestone.objects.bulk_create(created)
+    if updated:
+        Milestone.objects.bulk_update(updated, sorted(fields))
+    if created or updated:
+        bump_all_data_versions()
+    invalidate_milestone_catalog()
+    return results
+
+
+def seed_milestones():
+    for milestone, status in sync_milestone_catalog():
+        logger.info("%s milestone: %s", status.capitalize(), milestone.title)
 
     # Assign milestones to users
     for profile in Profile.objects.all():
@@ -190,87 +400,439 @@ def calculate_bmi(weight, height):
 
 
 def update_all_bmis():
-    # Inform when the process starts
-    print("🚀 Starting BMI update of all weight logs...")
-    
-    # Fetch all WeightLog records where weight is not null
-    logs = WeightLog.objects.exclude(weight__isnull=True)
-    total_logs = logs.count()
-    print(f"ℹ️  Found {total_logs} weight logs to update.")
-
-    updated_count = 0
-    for log in logs:
-        height = log.profile.height_cm
-        weight = log.weight
-
-        # Print current processing log
-        print(f"🔧 Processing log ID: {log.id}, Weight: {weight} kg, Height: {height} cm")
-
-        # Calculate BMI using utility function
-        bmi_data = calculate_bmi(weight, height)
-        log.bmi = bmi_data.get("value")
-
-        print(f"✅ Updated BMI for log ID {log.id}: {bmi_data}")
-
-        updated_count += 1
-
-    # Perform bulk update for performance
-    WeightLog.objects.bulk_update(logs, ['bmi'], batch_size=100)
-
-    # Final message after update is complete
-    print(f"🎯 Successfully updated BMI for {updated_count} logs.")
+    """
+    Recomputes every log's BMI from its profile's current height in a single
+    UPDATE, then the BMIs in ProfileStats. Returns the number of logs.
+
+    Logs keep their BMI in step on their own (see WeightLog.save and
+    Profile.refresh_bmis), this only repairs data written around them.
+    """
+    # A missing or zero height leaves the BMI NULL, as in bmi_for.
+    heights = Profile.objects.filter(pk=OuterRef("profile_id")).values(height=NullIf("height_cm", 0.0))
+    height_m = Subquery(heights[:1]) / 100.0
+    updated = WeightLog.objects.update(bmi=Round(F("weight") / (height_m * height_m), 2))
+    ProfileStats.refresh_bmis()
+    bump_all_data_versions()
+    return updated
 
 
 def update_streaks(profile=None):
+    """Rebuilds profiles' streak runs from their check-ins, the last run is the current streak."""
     profiles = Profile.objects.all()
     if profile:
         profiles = [profile]
 
     for profile in profiles:
-        logs = profile.weightlog_set.filter(check_in=True).exclude(weight__isnull=True).order_by("check_in_at")
-        prev_log = None
-        streaks = 0
+        check_ins = (
+            profile.weightlog_set.filter(check_in=True, check_in_at__isnull=False).exclude(weight__isnull=True)
+            .order_by("check_in_at").values_list("check_in_at", flat=True)
+        )
+        runs = []
         streaks_from = None
 
-        for log in logs:
-            if prev_log:
-                gap = (log.check_in_at.date() - prev_log.check_in_at.date()).days
-
-                if gap == 1:
-                    streaks += 1
-                elif gap == 2:  # and prev_log.check_in_at.isoweekday() == 6. For now if there's 1 day gap, the streak would be restored.
-                    streaks += 1
-                else:
-                    streaks = 1
-                    streaks_from = log.check_in_at
-            else:
-                streaks = 1
-                streaks_from = log.check_in_at
+        for check_in_at in check_ins:
+            day = check_in_at.date()
+            # Re-clocking in on the same day doesn't move the streak.
+            if runs and day == runs[-1].end:
+                continue
 
-            prev_log = log
+            gap = (day - runs[-1].end).days if runs else None
+            if gap in (1, 2):  # 2: and the previous check-in was a Saturday. For now if there's 1 day gap, the streak would be restored.
+                runs[-1].end = day
+                runs[-1].length += 1
+            else:
+                runs.append(StreakRun(profile=profile, start=day, end=day, length=1))
+                streaks_from = check_in_at
 
-        profile.streaks = streaks
+        current = runs[-1] if runs else None
+        profile.streaks = current.length if current else 0
         if streaks_from:
             profile.streaks_from = streaks_from
+        profile.last_check_in = current.end if current else None
 
+        StreakRun.objects.filter(profile=profile).delete()
+        StreakRun.objects.bulk_create(runs)
         profile.save()
 
     return None
 
 
+def advance_streak(profile, check_in_at):
+    """
+    Advance the profile's streak from a single new check-in in O(1).
+
+    Mirrors the rules of `update_streaks` using only `last_check_in`:
+    a 1 day gap continues the streak, a 2 day gap restores it and anything
+    longer starts a new one. Check-ins that land before the last known one
+    (or profiles that were never tracked) fall back to a full rebuild.
+    """
+    day = check_in_at.date()
+    last_day = profile.last_check_in
+
+    if last_day is None and profile.streaks:
+        return update_streaks(profile)
+    if last_day and day < last_day:
+        return update_streaks(profile)
+
+    # Re-clocking in on the same day doesn't move the streak.
+    if last_day == day and profile.streaks:
+        return None
+
+    gap = (day - last_day).days if last_day else None
+    if gap in (1, 2):
+        extended = StreakRun.objects.filter(profile=profile, end=last_day).update(end=day, length=F("length") + 1)
+        if not extended:
+            # The runs are behind the profile, catch them up.
+            return update_streaks(profile)
+        profile.streaks += 1
+    else:
+        StreakRun.objects.update_or_create(profile=profile, start=day, defaults={"end": day, "length": 1})
+        profile.streaks = 1
+        profile.streaks_from = check_in_at
+    profile.last_check_in = day
+
+    profile.save(update_fields=["streaks", "streaks_from", "last_check_in"])
+    return None
+
+
+def last_week(today=None):
+    """(Monday, Sunday) of the last full week."""
+    today = today or timezone.now().date()
+    end_date = today - timedelta(days=today.weekday() + 1)  # last Sunday
+    start_date = end_date - timedelta(days=6)  # previous Monday
+    return start_date, end_date
+
+
+# Rows parsed and written per round-trip while importing CSV logs.
+IMPORT_CHUNK_SIZE = 1000
+
+# Tried in order, day-first like our own export ("%d/%m/%y").
+IMPORT_DATE_FORMATS = [
+    "%d/%m/%y", "%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d-%m-%y", "%d.%m.%Y", "%m/%d/%Y", "%m/%d/%y",
+]
+
+
+class DateFormatCache:
+    """Parses dates with the last format that worked, re-detecting only on a miss."""
+
+    def __init__(self, formats=IMPORT_DATE_FORMATS):
+        self.formats = formats
+        self.format = None
+
+    def parse(self, value):
+        value = value.strip()
+        if self.format:
+            try:
+                return datetime.strptime(value, self.format).date()
+            except ValueError:
+                pass
+
+        for fmt in self.formats:
+            try:
+                parsed = datetime.strptime(value, fmt).date()
+            except ValueError:
+                continue
+            self.format = fmt
+            return parsed
+
+        from dateutil.parser import parse
+
+        return parse(value, dayfirst=True).date()
+
+
+def upsert_logs(profile, logs, update_fields=("weight", "notes", "bmi"), batch_size=None, refresh=True):
+    """
+    Writes the profile's logs in bulk, with the BMIs WeightLog.save() would set.
+
+    New logs are inserted, one for a day that already has a log overwrites its
+    `update_fields` instead (or leaves it alone when there are none). Logs with a
+    pk are updated. The bulk writes skip save() and its signals, so with `refresh`
+    the stats are rebuilt and the cached pages moved on; pass False while more
+    writes for the profile follow.
+    """
+    logs = list(logs)
+    for log in logs:
+        log.bmi = bmi_for(log.weight, profile.height_cm)
+    new = [log for log in logs if log.pk is None]
+    stored = [log for log in logs if log.pk is not None]
+
+    if new and update_fields:
+        WeightLog.objects.bulk_create(
+            new,
+            update_conflicts=True,
+            unique_fields=["profile", "date"],
+            update_fields=update_fields,
+            batch_size=batch_size,
+        )
+    elif new:
+        WeightLog.objects.bulk_create(new, ignore_conflicts=True, batch_size=batch_size)
+    if stored:
+        WeightLog.objects.bulk_update(stored, update_fields, batch_size=batch_size)
+
+    if refresh:
+        ProfileStats.rebuild(profile.pk)
+        bump_data_version(profile.pk)
+
+
+def _gap_logs(profile, weight, from_date, to_date):
+    """Auto generated logs for the days strictly between two imported rows."""
+    step = 1 if to_date > from_date else -1
+    for i in range(1, abs((to_date - from_date).days)):
+        weight = round(weight + random.uniform(-0.8, 0.8), 1)
+        yield WeightLog(
+            profile=profile,
+            date=from_date + timedelta(days=i * step),
+            weight=weight,
+            notes="Auto generated log.",
+        )
+
+
+def _write_import_chunk(profile, rows, gaps, last=False):
+    # Real rows overwrite whatever is there, generated ones never do.
+    upsert_logs(profile, rows.values(), refresh=False)
+    upsert_logs(profile, gaps.values(), update_fields=None, refresh=last)
+
+
+class ImportFileError(ValueError):
+    """The upload isn't readable as CSV, nothing from it was imported."""
+
+
+def import_weight_logs(profile, lines, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Streams CSV lines (as exported by Tracc / Google Sheets) into the profile's logs.
+
+    Rows are parsed and upserted `chunk_size` at a time, gaps between
+    consecutive rows are filled with generated logs. Rows that can't be parsed
+    are skipped (and logged). Returns the number of imported rows, raises
+    ImportFileError if the file itself is malformed.
+    """
+    started = time.perf_counter()
+    reader = csv.DictReader(lines)
+    dates = DateFormatCache()
+
+    imported_count = 0
+    rows, gaps = {}, {}
+    prev_date, prev_weight = None, None
+
+    try:
+        with transaction.atomic():
+            for row in reader:
+                try:
+                    date_obj = dates.parse(row["Date"])
+                    weight = float(row["Weight (kg)"]) if row["Weight (kg)"] else None
+                    notes = row.get("Notes/Mood", "")
+                except (KeyError, ValueError, TypeError, AttributeError, OverflowError) as e:
+                    logger.warning("Import for profile %s skipped line %s: %r", profile.pk, reader.line_num, e)
+                    continue
+
+                if prev_date and prev_weight and abs((prev_date - date_obj).days) > 1:
+                    for log in _gap_logs(profile, prev_weight, prev_date, date_obj):
+                        gaps.setdefault(log.date, log)
+
+                rows[date_obj] = WeightLog(profile=profile, date=date_obj, weight=weight, notes=notes)
+                gaps.pop(date_obj, None)
+                prev_date, prev_weight = date_obj, weight
+                imported_count += 1
+
+                if len(rows) + len(gaps) >= chunk_size:
+                    _write_import_chunk(profile, rows, gaps)
+                    rows, gaps = {}, {}
+
+            _write_import_chunk(profile, rows, gaps, last=True)
+    except (csv.Error, UnicodeDecodeError) as e:
+        # Raised while reading the file itself (an oversized or unterminated field, not
+        # UTF-8), everything written from it is rolled back. Bytes that don't decode
+        # fail before the reader counts their line.
+        line = reader.line_num + isinstance(e, UnicodeDecodeError)
+        raise ImportFileError(f"line {line}: {e}") from e
+
+    record_log_rows("import", imported_count, time.perf_counter() - started)
+    return imported_count
+
+
+# Readings accepted per ingest API request.
+INGEST_MAX_READINGS = 5000
+
+
+def _parse_reading(reading, latest_day):
+    """(date, weight, notes, measured_at) of a pushed reading, ValueError if it's invalid."""
+    weight = reading.get("weight")
+    if isinstance(weight, bool) or not isinstance(weight, (int, float)) or not 0 < weight < 1000:
+        raise ValueError("weight must be a number of kg.")
+    notes = reading.get("notes")
+    if notes is not None and not isinstance(notes, str):
+        raise ValueError("notes must be a string.")
+
+    measured_at = None
+    try:
+        if reading.get("measured_at"):
+            measured_at = datetime.fromisoformat(reading["measured_at"])
+            if timezone.is_naive(measured_at):
+                raise ValueError("measured_at needs a UTC offset.")
+            # The day on the scale's clock, not the server's.
+            day = measured_at.date()
+        elif reading.get("date"):
+            day = date.fromisoformat(reading["date"])
+        else:
+            raise ValueError("date or measured_at is required.")
+    except TypeError:
+        raise ValueError("date and measured_at must be ISO 8601 strings.")
+    if day > latest_day:
+        raise ValueError("date is in the future.")
+
+    return day, float(weight), notes, measured_at
+
+
+def ingest_readings(profile, readings, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Upserts readings pushed by scales and health apps into the profile's logs.
+
+    Every reading carries an idempotency key, keys seen before are skipped. A
+    day keeps one log, the latest reading of the day in the batch wins. All
+    of it is written in one transaction, in a few queries per `chunk_size`
+    readings. Returns a result per reading, in order.
+    """
+    started = time.perf_counter()
+    latest_day = timezone.localdate() + timedelta(days=1)
+    results = [None] * len(readings)
+
+    parsed = {}
+    for i, reading in enumerate(readings):
+        key = reading.get("key") if isinstance(reading, dict) else None
+        if not isinstance(key, str) or not 0 < len(key) <= 100:
+            results[i] = {"key": key, "status": "rejected", "error": "key must be a string of 1 to 100 characters."}
+            continue
+        if key in parsed:
+            results[i] = {"key": key, "status": "duplicate"}
+            continue
+        try:
+            parsed[key] = (i, *_parse_reading(reading, latest_day))
+        except ValueError as e:
+            results[i] = {"key": key, "status": "rejected", "error": str(e)}
+
+    keys = list(parsed)
+    seen = set()
+    for start in range(0, len(keys), chunk_size):
+        seen.update(
+            IngestedReading.objects.filter(profile=profile, key__in=keys[start:start + chunk_size])
+            .values_list("key", flat=True)
+        )
+
+    # Latest measurement of the day wins, then the latest in the batch.
+    winners = {}
+    for key, (i, day, weight, notes, measured_at) in parsed.items():
+        if key in seen:
+            results[i] = {"key": key, "status": "duplicate"}
+            continue
+        order = (measured_at.timestamp() if measured_at else float("-inf"), i)
+        if day in winners and winners[day][0] > order:
+            results[i] = {"key": key, "status": "superseded", "date": day.isoformat()}
+            continue
+        if day in winners:
+            loser = winners[day][1]
+            results[loser] = {"key": results[loser]["key"], "status": "superseded", "date": day.isoformat()}
+        winners[day] = (order, i, weight, notes)
+        results[i] = {"key": key, "date": day.isoformat()}
+
+    days = list(winners)
+    existing = set()
+    for start in range(0, len(days), chunk_size):
+        existing.update(profile.weightlog_set.filter(date__in=days[start:start + chunk_size]).values_list("date", flat=True))
+
+    # Readings without notes leave the day's notes alone.
+    with_notes, without_notes = [], []
+    for day, (order, i, weight, notes) in winners.items():
+        log = WeightLog(profile=profile, date=day, weight=weight, notes=notes or "")
+        (with_notes if notes is not None else without_notes).append(log)
+        results[i]["status"] = "updated" if day in existing else "created"
+
+    with transaction.atomic():
+        upsert_logs(profile, with_notes, batch_size=chunk_size, refresh=False)
+        upsert_logs(
+            profile, without_notes, update_fields=["weight", "bmi"], batch_size=chunk_size, refresh=bool(winners),
+        )
+        # Superseded readings were handled too, resending them is a duplicate.
+        IngestedReading.objects.bulk_create(
+            [
+                IngestedReading(profile=profile, key=key, date=day)
+                for key, (i, day, *_) in parsed.items() if key not in seen
+            ],
+            ignore_conflicts=True,
+            batch_size=chunk_size,
+        )
+
+    record_log_rows("ingest", len(readings), time.perf_counter() - started)
+    return results
+
+
+def daily_series(rows, start_date=None, end_date=None):
+    """
+    Spreads date-ordered (date, weight) rows over every day from `start_date` to
+    `end_date` (the first and last row by default) for the line charts. Days without
+    a weight repeat the previous one, the ones before the first weight take it.
+    """
+    if not rows:
+        return {}
+    start_date = start_date or rows[0][0]
+    end_date = end_date or rows[-1][0]
+
+    by_day = {log_date: weight for log_date, weight in rows if weight is not None and start_date <= log_date <= end_date}
+    weight = by_day[min(by_day)] if by_day else float("nan")
+
+    labels, weights = [], []
+    for ordinal in range(start_date.toordinal(), end_date.toordinal() + 1):
+        day = date.fromordinal(ordinal)
+        weight = by_day.get(day, weight)
+        labels.append(f"{day.day:02d}-{day.month:02d}-{day.year}")
+        weights.append(weight)
+
+    return {"labels": labels, "weights": weights}
+
+
+# date(1970, 1, 1).toordinal(), offsets ordinals to datetime64 days.
+UNIX_EPOCH_ORDINAL = 719163
+
+
 class Insights:
-    def __init__(self, logs):
+    def __init__(self, logs, db_aggregates=None):
         self.logs = logs
         self.circle_circumference = 2 * 3.1416 * 54  # ≈ 339.292
+        self._columns = None
+        # Group monthly averages and BMI zones in SQL instead of in Python.
+        if db_aggregates is None:
+            db_aggregates = settings.INSIGHTS_DB_AGGREGATES
+        self.db_aggregates = db_aggregates
+
+    @property
+    def columns(self):
+        """(days, weights, bmis) arrays of the logs, fetched once in one query."""
+        import numpy as np
+
+        if self._columns is None:
+            rows = list(self.logs.values_list("date", "weight", "bmi"))
+            dates, weights, bmis = zip(*rows) if rows else ((), (), ())
+            ordinals = np.fromiter(map(date.toordinal, dates), dtype=np.int64, count=len(dates))
+            days = (ordinals - UNIX_EPOCH_ORDINAL).astype("datetime64[D]")
+            # None becomes NaN in float arrays.
+            self._columns = (days, np.array(weights, dtype=float), np.array(bmis, dtype=float))
+        return self._columns
+
+    @staticmethod
+    def _format_days(days):
+        """datetime64 days as '%d-%m-%Y' strings."""
+        import numpy as np
+
+        return [f"{iso[8:10]}-{iso[5:7]}-{iso[:4]}" for iso in np.datetime_as_string(days).tolist()]
 
     def get_progress(self, profile):
+        """Progress ring from the profile's stats, doesn't touch the logs."""
         progress = None
         progress_offset = self.circle_circumference  # default if no progress
-        latest_weight_log = self.logs.order_by('-date').first()
-        latest_weight = latest_weight_log.weight if latest_weight_log else 0
-        
-        if profile.target_weight and latest_weight_log:
-            start_weight = self.logs.first().weight if self.logs else latest_weight
+        stats = ProfileStats.for_profile(profile)
+
+        if profile.target_weight and stats.log_count:
+            latest_weight = stats.current_weight
+            start_weight = stats.start_weight
             weight_diff = start_weight - profile.target_weight
             if weight_diff != 0:
                 progress = round(((start_weight - latest_weight) / weight_diff) * 100)
@@ -280,136 +842,129 @@ class Insights:
         return progress, progress_offset
 
     def get_line_data(self, recent_len=None, date_range=None):
-        line_data = {}
         if recent_len:
-            logs = self.logs.order_by('-date')[:recent_len]
+            rows = list(self.logs.order_by('-date').values_list("date", "weight")[:recent_len])[::-1]
         elif date_range:
-            start_date, end_date = date_range
-            logs = self.logs.filter(date__range=(start_date, end_date))
-        else: 
-            logs = self.logs
-
-        if not logs:
-            return line_data
-
-        # Convert to DataFrame
-        data = {
-            "date": [log.date for log in logs],
-            "weight": [log.weight for log in logs]
-        }
-        df = pd.DataFrame(data)
-
-        # Set date as index
-        df.set_index("date", inplace=True)
-        df.sort_index(inplace=True)
-
-        # Determine full range
-        if date_range:
-            start_date, end_date = date_range
+            rows = self.logs.filter(date__range=date_range).order_by("date").values_list("date", "weight")
         else:
-            start_date, end_date = df.index.min(), df.index.max()
+            rows = self.logs.order_by("date").values_list("date", "weight")
 
-        # Create full date range (inclusive)
-        full_range = pd.date_range(start=start_date, end=end_date, freq='D')
-        df = df.reindex(full_range)
+        return daily_series(list(rows), *(date_range or ()))
 
-        # Forward fill missing weights
-        df["weight"] = df["weight"].ffill().bfill()
+    def get_daily_change(self):
+        import numpy as np
 
-        # Format output
-        line_data = {
-            "labels": [d.strftime('%d-%m-%Y') for d in df.index],
-            "weights": df["weight"].tolist()
-        }
+        days, weights, _ = self.columns
 
-        return line_data
+        # Stop at the first missing weight.
+        missing = np.flatnonzero(np.isnan(weights))
+        count = missing[0] if missing.size else len(weights)
+        changes = np.diff(weights[:count]).tolist()
 
-    def get_daily_change(self):
-        daily_changes = []
-        previous_weight = None
-
-        for log in self.logs:
-            if log.weight is None:
-                break
-            date_str = log.date.strftime('%d-%m-%Y')
-            if previous_weight is not None:
-                change = round(log.weight - previous_weight, 1)
-                daily_changes.append({
-                    'date': date_str,
-                    'change': change
-                })
-            previous_weight = log.weight
-        return daily_changes
+        return [
+            {
+                'date': date_str,
+                'change': round(change, 1)
+            }
+            for date_str, change in zip(self._format_days(days[1:count]), changes)
+        ]
 
     def get_monthly_avg(self):
         """Returns dict with monthly average weight and bmi."""
-        from collections import defaultdict
         import calendar
-
-        monthly_data = defaultdict(list)
-        for log in self.logs:
-            if log.weight:
-                month_key = log.date.strftime('%Y-%m')
-                monthly_data[month_key].append((log.weight, log.bmi))
+        import numpy as np
+
+        if self.db_aggregates:
+            months = (
+                self.logs.exclude(weight__isnull=True).exclude(weight=0)
+                .annotate(month=TruncMonth("date"))
+                .values("month")
+                .annotate(avg_weight=Avg("weight"), avg_bmi=Avg("bmi"))
+                .order_by("month")
+            )
+            return [
+                {
+                    "month": f"{calendar.month_abbr[row['month'].month]} {row['month'].year}",
+                    "avg_weight": round(row["avg_weight"], 1),
+                    "avg_bmi": round(row["avg_bmi"], 1) if row["avg_bmi"] is not None else None
+                }
+                for row in months
+            ]
+
+        days, weights, bmis = self.columns
+        # Zero or missing weights don't count.
+        keep = np.nan_to_num(weights) != 0
+        if not keep.any():
+            return []
+
+        months = days[keep].astype("datetime64[M]").astype(int)
+        weights, bmis = weights[keep], bmis[keep]
+
+        # Months in order of first appearance, like the logs.
+        unique_months, first_index, month_index = np.unique(months, return_index=True, return_inverse=True)
+        order = np.argsort(first_index)
+
+        log_counts = np.bincount(month_index)
+        weight_sums = np.bincount(month_index, weights=weights)
+        has_bmi = ~np.isnan(bmis)
+        bmi_counts = np.bincount(month_index[has_bmi], minlength=len(unique_months))
+        bmi_sums = np.bincount(month_index[has_bmi], weights=bmis[has_bmi], minlength=len(unique_months))
 
         monthly_avg = []
-        for month, values in monthly_data.items():
-            weights = [v[0] for v in values]
-            bmis = [v[1] for v in values if v[1] is not None]
-            avg_weight = round(sum(weights) / len(weights), 1)
-            avg_bmi = round(sum(bmis) / len(bmis), 1) if bmis else None
-            month_label = f"{calendar.month_abbr[int(month.split('-')[1])]} {month.split('-')[0]}"
+        for i in order:
+            year, month = divmod(int(unique_months[i]) + 1970 * 12, 12)
             monthly_avg.append({
-                "month": month_label,
-                "avg_weight": avg_weight,
-                "avg_bmi": avg_bmi
+                "month": f"{calendar.month_abbr[month + 1]} {year}",
+                "avg_weight": round(float(weight_sums[i] / log_counts[i]), 1),
+                "avg_bmi": round(float(bmi_sums[i] / bmi_counts[i]), 1) if bmi_counts[i] else None
             })
         return monthly_avg
 
     def get_weight_zones(self):
         """Categorize logs into BMI zones."""
-        zones = {
-            "Underweight": 0,
-            "Normal": 0,
-            "Overweight": 0,
-            "Obese": 0,
-        }
-        for log in self.logs:
-            if log.bmi is None:
-                continue
-            if log.bmi < 18.5:
-                zones["Underweight"] += 1
-            elif 18.5 <= log.bmi < 25:
-                zones["Normal"] += 1
-            elif 25 <= log.bmi < 30:
-                zones["Overweight"] += 1
-            else:
-                zones["Obese"] += 1
+        import numpy as np
+
+        if self.db_aggregates:
+            zones = self.logs.aggregate(
+                underweight=Count(Case(When(bmi__lt=18.5, then=1))),
+                normal=Count(Case(When(bmi__gte=18.5, bmi__lt=25, then=1))),
+                overweight=Count(Case(When(bmi__gte=25, bmi__lt=30, then=1))),
+                obese=Count(Case(When(bmi__gte=30, then=1))),
+            )
+            counts = [zones["underweight"], zones["normal"], zones["overweight"], zones["obese"]]
+        else:
+            _, _, bmis = self.columns
+            bmis = bmis[~np.isnan(bmis)]
+            counts = np.bincount(np.digitize(bmis, [18.5, 25, 30]), minlength=4)
 
         weight_zones = [
             {
                 "label": zone,
-                "count": count,
+                "count": int(count),
                 "color": f"--bmi-{zone.lower()}"
             }
-            for zone, count in zones.items() 
+            for zone, count in zip(["Underweight", "Normal", "Overweight", "Obese"], counts)
         ]
 
         return weight_zones
 
     def get_fastest_drop(self):
-        fastest = None
-        previous_weight = None
-        for log in self.logs:
-            if log.weight is None:
-                continue
-            if previous_weight is not None:
-                drop = round(log.weight - previous_weight, 1)
-                if drop < 0:  # drop means negative change
-                    if (fastest is None) or (drop < fastest["drop"]):
-                        fastest = {
-                            "date": log.date.strftime('%d-%m-%Y'),
-                            "drop": drop
-                        }
-            previous_weight = log.weight
-        return fastest
+        import numpy as np
+
+        days, weights, _ = self.columns
+        logged = np.flatnonzero(~np.isnan(weights))
+        if logged.size < 2:
+            return None
+
+        changes = np.diff(weights[logged])
+        drop = round(float(changes.min()), 1)
+        if drop >= 0:  # drop means negative change
+            return None
+
+        # First change that rounds to the biggest drop.
+        for i in np.flatnonzero(changes <= changes.min() + 0.1):
+            if round(float(changes[i]), 1) == drop:
+                return {
+                    "date": self._format_days(days[logged[i + 1]:logged[i + 1] + 1])[0],
+                    "drop": drop
+                }
@@ -1,25 +1,38 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User
-from django.http import JsonResponse, HttpResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from django.db import connection
-from django.db.models import Exists, OuterRef, F, Value
+from django.db import transaction, IntegrityError
+from django.db.models import Exists, OuterRef, F, Max, Q, Value
 from django.db.models.functions import Replace
-from django.core.management import call_command
+from django.views.decorators.cache import cache_control
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_POST
 from django.conf import settings
+from django.utils.text import compress_sequence
+from django.utils.formats import date_format
 
 import csv
-import io
-import random
-from dateutil.parser import parse
-from datetime import datetime, timedelta
-
-from .models import Profile, WeightLog, UserMilestone, WeeklySummary, Milestone
-from .utils import Insights, calculate_bmi, update_streaks, check_for_achievements
+import hashlib
+import hmac
+import json
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from time import perf_counter
+
+from . import metrics
+from .models import (
+    ApiToken, Profile, ProfileStats, StreakRun, WeightLog, UserMilestone, WeeklySummary, Milestone, SummaryJob,
+)
+from .utils import (
+    Insights, calculate_bmi, update_streaks, advance_streak, check_for_achievements, import_weight_logs,
+    cached_for_profile, batched_data_versions, last_week, ingest_readings, upsert_logs, ImportFileError,
+    INGEST_MAX_READINGS,
+)
 
 
 # ---------- Register ----------
@@ -94,9 +107,11 @@ def get_more_data(request):
         profile.dob = dob if dob else None
         profile.save()
 
-        # Save first weight log
+        # Save first weight log, submitting the form again the same day replaces it.
         if current_weight and not is_update:
-            WeightLog.objects.create(profile=profile, weight=current_weight)
+            WeightLog.objects.update_or_create(
+                profile=profile, date=timezone.localdate(), defaults={"weight": current_weight},
+            )
 
         if is_update:
             return redirect('settings')
@@ -106,8 +121,39 @@ def get_more_data(request):
     return render(request, 'profile/get_more_data.html', {'profile': profile, 'is_update':is_update})
 
 
+# ---------- Conditional GET ----------
+def page_etag(request, *args, **kwargs):
+    """Changes with the user's data, the day, their CSRF secret (rotated on login) and the release."""
+    # Flash messages are only shown once, never answer 304 over them.
+    if len(messages.get_messages(request)):
+        return None
+    profile = request.user.profile
+    key = ":".join(map(str, (
+        profile.pk, profile.data_version, timezone.localdate(),
+        request.META.get("CSRF_COOKIE", ""), settings.RELEASE_VERSION,
+    )))
+    return hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+
+
+def page_last_modified(request, *args, **kwargs):
+    if len(messages.get_messages(request)):
+        return None
+    midnight = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    return max(filter(None, (request.user.profile.data_changed_at, request.user.last_login, midnight)))
+
+
+def conditional_page(view):
+    """
+    Answers revalidations of a user's page with 304 Not Modified, before the view
+    runs, until their data changes. Browsers are told to always revalidate.
+    """
+    view = condition(etag_func=page_etag, last_modified_func=page_last_modified)(view)
+    return cache_control(private=True, no_cache=True)(view)
+
+
 # ---------- Dashboard ----------
 @login_required
+@conditional_page
 def dashboard(request):
     profile = request.user.profile
     today = timezone.localdate()
@@ -121,7 +167,7 @@ def dashboard(request):
     # Recent and Latest.
     recent_len = 5
     recent_logs = logs.order_by('-date')[:recent_len]
-    latest_weight = logs.last().weight
+    latest_weight = ProfileStats.for_profile(profile).current_weight
 
     # Call Insights class.
     insights = Insights(logs)
@@ -165,10 +211,52 @@ def mark_summary_checked(request, pk):
 
 
 # ---------- Logs ----------
+LOGS_PAGE_SIZE = 30
+LOG_LIST_FIELDS = ("id", "date", "weight", "notes")
+
+
+def get_logs_page(profile, cursor=None):
+    """
+    Keyset page of the profile's logs, newest first, after `cursor`.
+
+    The cursor is "<date>_<id>" of the last log on the previous page.
+    Returns the page and the cursor for the next one (None on the last page).
+    """
+    logs = profile.weightlog_set.order_by("-date", "-id").values(*LOG_LIST_FIELDS)
+    if cursor:
+        cursor_date, cursor_id = cursor.split("_")
+        cursor_date = date.fromisoformat(cursor_date)
+        logs = logs.filter(Q(date__lt=cursor_date) | Q(date=cursor_date, id__lt=int(cursor_id)))
+
+    page = list(logs[:LOGS_PAGE_SIZE + 1])
+    next_cursor = None
+    if len(page) > LOGS_PAGE_SIZE:
+        page = page[:LOGS_PAGE_SIZE]
+        next_cursor = f"{page[-1]['date'].isoformat()}_{page[-1]['id']}"
+
+    return page, next_cursor
+
+
 @login_required
+@conditional_page
 def weightlog_list(request):
-    logs = request.user.profile.weightlog_set.all()
-    return render(request, 'logs/weightlog_list.html', {'logs': logs})
+    logs, next_cursor = get_logs_page(request.user.profile)
+    return render(request, 'logs/weightlog_list.html', {'logs': logs, 'next_cursor': next_cursor})
+
+
+@login_required
+@conditional_page
+def weightlog_page(request):
+    try:
+        logs, next_cursor = get_logs_page(request.user.profile, request.GET.get("cursor"))
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "Invalid cursor"}, status=400)
+
+    for log in logs:
+        log["date_display"] = date_format(log["date"])
+        log["date"] = log["date"].isoformat()
+
+    return JsonResponse({"logs": logs, "next_cursor": next_cursor})
 
 
 # ---------- Add or Edit Logs ----------
@@ -187,13 +275,12 @@ def add_or_edit_weight_log(request, pk=None):
             # Editing existing log
             log = get_object_or_404(profile.weightlog_set, pk=pk)
         else:
-            # Add new log OR get today's log if check_in
-            log, created = WeightLog.objects.get_or_create(profile=profile, date=today)
+            # Today's log if there is one, else a new one written once below with its values set.
+            log = profile.weightlog_set.filter(date=today).first() or WeightLog(profile=profile, date=today)
 
         # Update fields
         if weight:
             log.weight = weight
-            log.bmi = calculate_bmi(weight, profile.height_cm).get("value")
         log.notes = notes
 
         # Today's clock in.
@@ -201,26 +288,188 @@ def add_or_edit_weight_log(request, pk=None):
             log.check_in = True
             log.check_in_at = timezone.now()
 
-        # Save logs.
-        log.save()
-
-        # Update Streaks and check achievements.
-        if log.check_in and log.weight:
-            update_streaks(profile)
-            check_for_achievements(profile)
+        # The log, streak and milestone writes all invalidate the same pages, move them on once.
+        with batched_data_versions():
+            # Save logs.
+            log.save()
+
+            # Update Streaks and check achievements.
+            if log.check_in and log.weight:
+                if pk:
+                    # Editing a past log can reshape history, rebuild it.
+                    update_streaks(profile)
+                else:
+                    advance_streak(profile, log.check_in_at)
+                check_for_achievements(profile)
     
         if not weight:
             return redirect('dashboard')
         return redirect('weightlog_list')
 
 
+# ---------- Offline sync ----------
+SYNC_BATCH_SIZE = 100
+
+
+class SyncEntryError(ValueError):
+    pass
+
+
+def parse_sync_entry(entry, now):
+    """
+    Validates one log write queued by the service worker while offline.
+    Returns (day, recorded_at, weight, notes, check_in, log_id).
+    """
+    if not isinstance(entry, dict):
+        raise SyncEntryError("Entries must be objects.")
+    try:
+        day = date.fromisoformat(entry["date"])
+        recorded_at = datetime.fromisoformat(entry["recorded_at"])
+    except (KeyError, TypeError, ValueError):
+        raise SyncEntryError("date and recorded_at must be ISO 8601.")
+    if timezone.is_naive(recorded_at):
+        raise SyncEntryError("recorded_at needs a UTC offset.")
+    # The device's day can be ahead of the server's, its clock can't be.
+    if day > timezone.localdate(now) + timedelta(days=1):
+        raise SyncEntryError("date is in the future.")
+    recorded_at = min(recorded_at, now)
+
+    weight = entry.get("weight") or None
+    if weight is not None:
+        try:
+            weight = float(weight)
+        except (TypeError, ValueError):
+            raise SyncEntryError("weight must be a number.")
+        if not 0 < weight < 1000:
+            raise SyncEntryError("weight is out of range.")
+
+    log_id = entry.get("log_id") or None
+    if log_id is not None:
+        try:
+            log_id = int(log_id)
+        except (TypeError, ValueError, OverflowError):
+            raise SyncEntryError("log_id must be an integer.")
+
+    notes = entry.get("notes")
+    if notes is not None and not isinstance(notes, str):
+        raise SyncEntryError("notes must be a string.")
+
+    return day, recorded_at, weight, notes or "", bool(entry.get("check_in")), log_id
+
+
+def apply_sync_entries(profile, entries, now):
+    """
+    Replays the queued log writes in order. Entries set values rather than add
+    to them, so replaying one changes nothing. The logs they touch are read in
+    one query and written back with one bulk insert and one bulk update.
+    Returns a result per entry and the written logs.
+    """
+    results, parsed = [], []
+    for entry in entries:
+        entry_id = entry.get("id") if isinstance(entry, dict) else None
+        try:
+            parsed.append((len(results), *parse_sync_entry(entry, now)))
+            results.append({"id": entry_id, "status": "ok"})
+        except SyncEntryError as e:
+            results.append({"id": entry_id, "status": "rejected", "error": str(e)})
+
+    days = {day for _, day, *_ in parsed}
+    log_ids = {log_id for *_, log_id in parsed if log_id is not None}
+    stored = list(profile.weightlog_set.filter(Q(date__in=days) | Q(pk__in=log_ids))) if parsed else []
+    by_pk = {log.pk: log for log in stored}
+    by_date = {log.date: log for log in stored}
+    before = {log.pk: (log.weight, log.notes, log.check_in, log.check_in_at) for log in stored}
+
+    written, entry_logs = {}, {}
+    for i, day, recorded_at, weight, notes, check_in, log_id in parsed:
+        if log_id is not None:
+            log = by_pk.get(log_id)
+            if log is None:
+                results[i] = {**results[i], "status": "rejected", "error": "Log not found."}
+                continue
+        else:
+            log = by_date.get(day)
+            if log is None:
+                log = by_date[day] = WeightLog(profile=profile, date=day)
+
+        if weight is not None:
+            log.weight = weight
+        log.notes = notes
+        # The first clock in of the day is the one that counts, replays keep it.
+        if check_in and not log.check_in:
+            log.check_in = True
+            log.check_in_at = recorded_at
+        written[log.date] = entry_logs[i] = log
+
+    created = [log for log in written.values() if log.pk is None]
+    updated = [
+        log for log in written.values()
+        if log.pk is not None and before[log.pk] != (log.weight, log.notes, log.check_in, log.check_in_at)
+    ]
+    if created or updated:
+        # A log written for the day since the read (another tab, the scale) is updated instead.
+        upsert_logs(profile, created + updated, update_fields=["weight", "notes", "check_in", "check_in_at", "bmi"])
+
+    for i, log in entry_logs.items():
+        results[i]["log_id"] = log.pk
+    return results, created + updated
+
+
+@login_required
+@require_POST
+def sync_weight_logs(request):
+    """
+    Bulk log writes flushed by the service worker's offline queue, applied in
+    order. Stats, streaks and achievements are recomputed once for the whole batch.
+    """
+    try:
+        entries = json.loads(request.body)["entries"]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"error": "Expected a JSON object with an entries list."}, status=400)
+    if not isinstance(entries, list):
+        return JsonResponse({"error": "Expected a JSON object with an entries list."}, status=400)
+    if len(entries) > SYNC_BATCH_SIZE:
+        return JsonResponse({"error": f"At most {SYNC_BATCH_SIZE} entries per request."}, status=400)
+
+    profile = request.user.profile
+    # Entries are rejected before they write anything, the rest go in together.
+    with transaction.atomic():
+        results, written = apply_sync_entries(profile, entries, timezone.now())
+
+        # Update Streaks and check achievements, once per batch.
+        if any(log.check_in and log.weight for log in written):
+            update_streaks(profile)
+            check_for_achievements(profile)
+
+    return JsonResponse({"results": results, "streaks": profile.streaks})
+
+
+def service_worker(request):
+    # A worker only controls pages under its own path, so it's served from the root.
+    response = render(request, "offline/service-worker.js", {
+        "release": settings.RELEASE_VERSION,
+        "sync_batch_size": SYNC_BATCH_SIZE,
+    }, content_type="application/javascript")
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+def offline_view(request):
+    return render(request, "offline/offline.html")
+
+
 # ---------- Delete Logs ----------
 @login_required
 def delete_weight_log(request, pk):
     log = get_object_or_404(request.user.profile.weightlog_set, pk=pk)
     
     if request.method == 'POST':
+        was_check_in = log.check_in
         log.delete()
+
+        # Deleting a check-in can break the streak, rebuild it.
+        if was_check_in:
+            update_streaks(request.user.profile)
         return redirect('weightlog_list')
 
 
@@ -231,23 +480,6 @@ def settings_views(request):
 
 
 # ---------- Import Logs ----------
-def generate_logs(profile, weight, start_date, end_date):
-    log_count = (end_date - start_date).days - 1
-    for i in range(log_count):
-        date = start_date - timedelta(days=i+1)
-        weight_variation = random.uniform(-0.8, 0.8)
-        new_weight = round(weight + weight_variation, 1)
-        bmi = calculate_bmi(new_weight, profile.height_cm).get("value")
-        
-        log, created = WeightLog.objects.get_or_create(
-            profile=profile,
-            date=date,
-            defaults={"weight": weight, "notes": "Auto generated log.", "bmi": bmi}
-        )
-        weight = new_weight
-
-    return created
-
 @login_required
 def import_logs(request):
     if request.method == "POST" and request.FILES.get("csv_file"):
@@ -258,48 +490,15 @@ def import_logs(request):
             messages.error(request, "Please upload a valid CSV file.")
             return redirect("settings")
 
-        # Decode file
-        data = csv_file.read().decode("utf-8")
-        io_string = io.StringIO(data)
-        reader = csv.DictReader(io_string)
+        # Stream decoded lines instead of reading the whole upload.
+        lines = (line.decode("utf-8-sig") for line in csv_file)
 
         profile = request.user.profile
-        imported_count = 0
-
-        for row in reader:
-            try:
-                # Parse date
-                prev_date, prev_weight = None
-                date_obj = parse(row["Date"]).date()
-
-                weight = float(row["Weight (kg)"]) if row["Weight (kg)"] else None
-                notes = row.get("Notes/Mood", "")
-                bmi = calculate_bmi(weight, profile.height_cm).get("value") if weight else None
-
-                if prev_date and (prev_date - date_obj).days > 1:
-                    generate_logs(profile, prev_weight, prev_date, date_obj)
-
-                prev_date = date_obj
-                prev_weight = weight
-
-                # Avoid duplicates
-                log, created = WeightLog.objects.get_or_create(
-                    profile=profile,
-                    date=date_obj,
-                    defaults={"weight": weight, "notes": notes, "bmi": bmi}
-                )
-
-                if not created:
-                    # If already exists, update
-                    log.weight = weight
-                    log.notes = notes
-                    log.save()
-
-                imported_count += 1
-
-            except Exception as e:
-                print(f"Row skipped due to error: {e}")
-                continue
+        try:
+            imported_count = import_weight_logs(profile, lines)
+        except ImportFileError as e:
+            messages.error(request, f"Couldn't read the CSV file ({e}), nothing was imported.")
+            return redirect("settings")
 
         # Update Streaks and check achievements.
         update_streaks(profile)
@@ -313,47 +512,83 @@ def import_logs(request):
 
 
 # ---------- Export Logs ----------
-@login_required
-def export_logs(request):
-    profile = request.user.profile
-    logs = profile.weightlog_set.all().order_by("date")
+EXPORT_CHUNK_SIZE = 2000
 
-    # Create the HttpResponse with CSV header
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = 'attachment; filename="weight_logs.csv"'
 
-    writer = csv.writer(response)
-    # Write header row (same as import)
-    writer.writerow(["Date", "Weight (kg)", "Notes/Mood"])
+class Echo:
+    """File-like object that hands back what csv.writer writes to it."""
 
-    # Write logs
-    for log in logs:
-        writer.writerow([
-            log.date.strftime("%d/%m/%y"),  # same format as import
-            log.weight if log.weight is not None else "",
-            log.notes or ""
-        ])
+    def write(self, value):
+        return value
 
-    return response
+
+def stream_logs_csv(rows):
+    writer = csv.writer(Echo())
+    # Header row (same as import), sent before touching the logs.
+    yield writer.writerow(["Date", "Weight (kg)", "Notes/Mood"])
+
+    started = perf_counter()
+    exported = 0
+    chunk = []
+    try:
+        for log_date, weight, notes in rows:
+            chunk.append(writer.writerow([
+                log_date.strftime("%d/%m/%y"),  # same format as import
+                weight if weight is not None else "",
+                notes or ""
+            ]))
+            if len(chunk) >= EXPORT_CHUNK_SIZE:
+                exported += len(chunk)
+                yield "".join(chunk)
+                chunk = []
+        if chunk:
+            exported += len(chunk)
+            yield "".join(chunk)
+    finally:
+        # Includes the time the client took to read it, downloads given up on count what was sent.
+        metrics.record_log_rows("export", exported, perf_counter() - started)
 
 
-# ---------- Analytics ----------
 @login_required
-def analytics(request):
+def export_logs(request):
     profile = request.user.profile
-    logs = profile.weightlog_set.exclude(weight__isnull=True).order_by('date')
+    rows = (
+        profile.weightlog_set.order_by("date")
+        .values_list("date", "weight", "notes")
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    content = stream_logs_csv(rows)
+
+    filename = "weight_logs.csv"
+    content_type = "text/csv"
+    if request.GET.get("gzip", "").lower() in ("1", "true"):
+        content = compress_sequence(part.encode("utf-8") for part in content)
+        filename += ".gz"
+        content_type = "application/gzip"
+
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
 
-    insights = Insights(logs)
 
-    # Graphs processing
-    line_data = insights.get_line_data()
-    daily_changes = insights.get_daily_change()
-    monthly_avg = insights.get_monthly_avg()
-    weight_zones = insights.get_weight_zones()
+# ---------- Analytics ----------
+def analytics_logs(profile):
+    return profile.weightlog_set.exclude(weight__isnull=True).order_by('date')
+
+
+# Everything on the analytics page that grows with the history, each fetched by
+# the page on its own after first paint.
+ANALYTICS_CHARTS = {
+    "line": lambda profile: Insights(analytics_logs(profile)).get_line_data(),
+    "daily-changes": lambda profile: Insights(analytics_logs(profile)).get_daily_change(),
+    "monthly-avg": lambda profile: Insights(analytics_logs(profile)).get_monthly_avg(),
+    "weight-zones": lambda profile: Insights(analytics_logs(profile)).get_weight_zones(),
+    "fastest-drop": lambda profile: Insights(analytics_logs(profile)).get_fastest_drop(),
+}
+
 
-    # Cards.
-    streaks = profile.streaks
-    fastest_drop = insights.get_fastest_drop()
+def get_analytics_data(profile):
+    """The analytics page around its charts, cached per profile data version."""
     usermilestones = UserMilestone.objects.filter(profile=profile).last()
 
     milestones = None
@@ -361,7 +596,7 @@ def analytics(request):
         milestones = usermilestones.milestone
 
     # Fetch all milestones and annotate if unlocked for this user
-    all_milestones = Milestone.objects.annotate(
+    all_milestones = list(Milestone.objects.annotate(
         is_unlocked=Exists(
             UserMilestone.objects.filter(
                 milestone=OuterRef('pk'), 
@@ -369,108 +604,226 @@ def analytics(request):
             )
         ),
         clean_category=Replace(F('category'), Value('_'), Value(' ')),
-    ).order_by('category')
-
-    # Calendar events.
-    streak_events = []
-    streak_dates = set()
-    logs_by_date = {
-        log.date.strftime("%Y-%m-%d"): log
-        for log in logs
-    }
-    if profile.streaks and profile.streaks > 1 and profile.streaks_from:
-        buffer = 0
-        for i in range(profile.streaks):
-            streak_day = profile.streaks_from + timedelta(days=i+buffer)
-
-            log = logs_by_date.get(streak_day.strftime("%Y-%m-%d"))
-            if not log or not log.weight or not log.check_in:
-                buffer += 1
-
-            streak_day = profile.streaks_from + timedelta(days=i+buffer)
-
-            formatted_date = streak_day.strftime("%Y-%m-%d")
-            streak_dates.add(formatted_date)
-            streak_events.append({
-                "type": "streak",
-                "date": formatted_date
-            })
-
-    checkin_logs = logs.filter(check_in=True)
-    checkins = [
-        {
-            "type": "checkin",
-            "date": log.date.strftime("%Y-%m-%d")
-        }
-        for log in checkin_logs
-        if log.date.strftime("%Y-%m-%d") not in streak_dates
-    ]
-
-    calendar_events = checkins + streak_events
+    ).order_by('category'))
 
     # latest summary for the logged-in user
-    summary = WeeklySummary.objects.filter(user=request.user).order_by('-week_start').first()
+    summary = WeeklySummary.objects.filter(user_id=profile.user_id).order_by('-week_start').first()
     sum_line_data = {}
     if summary:
-        sum_line_data = insights.get_line_data(date_range=(summary.week_start, summary.week_end))
+        sum_line_data = Insights(analytics_logs(profile)).get_line_data(date_range=(summary.week_start, summary.week_end))
 
-    context = {
-        "profile": profile,
-        "line_data": line_data,
-        "daily_changes": daily_changes,
-        "monthly_avg": monthly_avg,
-        "weight_zones": weight_zones,
-        "streaks": streaks,
+    longest_streak = StreakRun.objects.filter(profile=profile).aggregate(longest=Max("length"))["longest"]
+
+    return {
+        "current_bmi": profile.bmi() if profile.height_cm else None,
+        "streaks": profile.streaks,
+        "longest_streak": longest_streak or 0,
         "milestones": milestones,
         "all_milestones": all_milestones,
-        "fastest_drop": fastest_drop,
-        "calendar_events": calendar_events,
         'summary': summary,
         'sum_line_data': sum_line_data
     }
+
+
+@login_required
+@conditional_page
+def analytics(request):
+    profile = request.user.profile
+    data = cached_for_profile(profile, "analytics", lambda: get_analytics_data(profile))
+
+    context = {"profile": profile, **data}
     return render(request, "pages/analytics.html", context)
 
 
-# ---------- Health ----------
-def health_view(request):
-    db_status = False
+@login_required
+@conditional_page
+def analytics_chart(request, chart):
+    compute = ANALYTICS_CHARTS.get(chart)
+    if compute is None:
+        raise Http404("No such chart.")
+
+    profile = request.user.profile
+    data = cached_for_profile(profile, f"chart:{chart}", lambda: compute(profile))
+    return JsonResponse(data, safe=False)
+
+
+# Longest span the calendar asks for, a month view shows up to 6 weeks.
+CALENDAR_MAX_DAYS = 62
+
+
+@login_required
+@conditional_page
+def analytics_calendar(request):
+    """
+    Calendar events between `start` and `end` (exclusive), as sent by FullCalendar,
+    answered from the streak runs: days of a streak, lone check-ins, and the
+    skipped days a 2 day gap restored the streak over.
+    """
+    try:
+        start = datetime.fromisoformat(request.GET["start"]).date()
+        end = datetime.fromisoformat(request.GET["end"]).date()
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "start and end must be ISO 8601 dates."}, status=400)
+    if not 0 < (end - start).days <= CALENDAR_MAX_DAYS:
+        return JsonResponse({"error": f"Ask for 1 to {CALENDAR_MAX_DAYS} days."}, status=400)
+
+    profile = request.user.profile
+    runs = list(
+        StreakRun.objects.filter(profile=profile, start__lt=end, end__gte=start).values_list("start", "end", "length")
+    )
+    # Check-in days as update_streaks counts them, a log's date can be a day off its check-in's.
+    check_in_days = set()
+    if any(length > 1 for *_, length in runs):
+        check_ins = profile.weightlog_set.filter(
+            check_in=True, check_in_at__isnull=False, weight__isnull=False,
+            date__range=(start - timedelta(days=1), end + timedelta(days=1)),
+        ).values_list("check_in_at", flat=True)
+        check_in_days = {check_in_at.date() for check_in_at in check_ins}
+
+    events = []
+    for run_start, run_end, length in runs:
+        day = max(run_start, start)
+        while day <= run_end and day < end:
+            if length == 1:
+                event_type = "checkin"
+            else:
+                event_type = "streak" if day in check_in_days else "restored"
+            events.append({"type": event_type, "date": day.isoformat()})
+            day += timedelta(days=1)
+
+    return JsonResponse(events, safe=False)
+
+
+# ---------- Ingest API ----------
+def api_token_user(request):
+    """The active user of the request's `Authorization: Bearer <key>` token, or None."""
+    scheme, _, key = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not key.strip():
+        return None
+
+    token = ApiToken.objects.select_related("user").filter(key_hash=ApiToken.hash_key(key.strip())).first()
+    if token is None or not token.user.is_active:
+        return None
+    ApiToken.objects.filter(pk=token.pk).update(last_used_at=timezone.now())
+    return token.user
+
+
+@csrf_exempt
+@require_POST
+def api_readings(request):
+    """
+    Bulk JSON ingest for smart scales and health apps:
+    `{"readings": [{"key": ..., "weight": 78.4, "measured_at" or "date": ..., "notes": ...}]}`.
+    Answers with a result per reading, see `ingest_readings`.
+    """
+    user = api_token_user(request)
+    if user is None:
+        response = JsonResponse({"error": "Unauthorized"}, status=401)
+        response["WWW-Authenticate"] = "Bearer"
+        return response
+
     try:
-        # Just test if DB responds
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT 1;")
-        db_status = True
-    except Exception:
-        db_status = False
+        readings = json.loads(request.body)["readings"]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"error": "Expected a JSON object with a readings list."}, status=400)
+    if not isinstance(readings, list):
+        return JsonResponse({"error": "Expected a JSON object with a readings list."}, status=400)
+    if len(readings) > INGEST_MAX_READINGS:
+        return JsonResponse({"error": f"At most {INGEST_MAX_READINGS} readings per request."}, status=400)
+
+    profile = Profile.objects.filter(user=user).first()
+    if profile is None:
+        return JsonResponse({"error": "Complete your profile before syncing readings."}, status=409)
+
+    results = ingest_readings(profile, readings)
+    counts = Counter(result["status"] for result in results)
+
+    # Readings aren't clock-ins, streaks stay as they are.
+    if counts["created"] or counts["updated"]:
+        check_for_achievements(profile)
+
+    return JsonResponse({"results": results, "counts": dict(counts)})
 
+
+# ---------- Health ----------
+def health_view(request):
+    # Probes come often, the check is shared with /metrics/ and reused for a few seconds.
+    health = metrics.database_health()
     context = {
-        "db_status": db_status,
-        "checked_at": timezone.now(),
+        "db_status": health["ok"],
+        "checked_at": health["checked_at"],
     }
     return render(request, "pages/health.html", context)
 
 def health_json(request):
-    db_status = False
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT 1;")
-        db_status = True
-    except Exception:
-        db_status = False
-
+    health = metrics.database_health()
     return JsonResponse({
-        "status": "ok" if db_status else "error",
-        "database": db_status,
-        "checked_at": timezone.now().isoformat(),
+        "status": "ok" if health["ok"] else "error",
+        "database": health["ok"],
+        "checked_at": health["checked_at"].isoformat(),
     })
 
 
+def metrics_view(request):
+    """Prometheus text format, see weight/metrics.py for what's in it."""
+    if not settings.METRICS_TOKEN:
+        # Open only on a development box, a forgotten token mustn't publish them.
+        if not settings.DEBUG:
+            return JsonResponse({"error": "Metrics are disabled, set METRICS_TOKEN to serve them."}, status=403)
+    else:
+        scheme, _, key = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(key.strip().encode(), settings.METRICS_TOKEN.encode()):
+            response = JsonResponse({"error": "Unauthorized"}, status=401)
+            response["WWW-Authenticate"] = "Bearer"
+            return response
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # ---------- Weekly summary ----------
+def job_status(job):
+    return {
+        "job_id": job.pk,
+        "status": job.status,
+        "week_start": job.week_start.isoformat(),
+        "week_end": job.week_end.isoformat(),
+        "progress": {
+            "profiles_done": job.profiles_done,
+            "profiles_total": job.profiles_total,
+        },
+        "generated": job.generated,
+        "skipped": job.skipped,
+        "failures": job.failures,
+        "error": job.error,
+        "duration": job.duration(),
+        "status_url": reverse("weekly_summary_job", args=[job.pk]),
+    }
+
+
 @csrf_exempt
 def run_weekly_summary(request):
     # simple token-based protection
     token = request.GET.get("token")
     if token != settings.CRON_SECRET:
         return JsonResponse({"error": "Unauthorized"}, status=403)
-    
-    call_command("generate_weekly_summaries")
-    return JsonResponse({"status": "success"})
+
+    # Queue it for the run_summary_jobs worker, a week is only run once.
+    week_start, week_end = last_week()
+    # A job left running by a dead worker would hold the week forever.
+    SummaryJob.fail_stale()
+    try:
+        with transaction.atomic():
+            job = SummaryJob.objects.create(week_start=week_start, week_end=week_end)
+    except IntegrityError:
+        job = SummaryJob.objects.exclude(status=SummaryJob.FAILED).get(week_start=week_start, week_end=week_end)
+        return JsonResponse({"message": "Summary for this week already queued or run", **job_status(job)}, status=409)
+
+    return JsonResponse(job_status(job), status=202)
+
+
+def weekly_summary_job(request, pk):
+    token = request.GET.get("token")
+    if token != settings.CRON_SECRET:
+        return JsonResponse({"error": "Unauthorized"}, status=403)
+
+    job = get_object_or_404(SummaryJob, pk=pk)
+    return JsonResponse(job_status(job))